@@ -0,0 +1,31 @@
+import os, threading
+
+# The anthropic SDK and dotenv are imported on first API use, so modules that only format results
+# (or run offline) import quickly and work without an API key.
+_client = None
+_lock = threading.Lock()
+
+def get_client():
+    """The process-wide Anthropic client, built on first call (honours ANTHROPIC_BASE_URL)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from anthropic import Anthropic
+                from dotenv import load_dotenv
+                load_dotenv() # Environment variables
+                _client = Anthropic(
+                    api_key=os.environ["ANTHROPIC_API_KEY"],   # use ANTHROPIC_API_KEY
+                    max_retries=0,  # retries and backoff live in claude_test.rate_limiter
+                )
+    return _client
+
+def set_client(client):
+    """Use client (e.g. a fake for benchmarks) instead of building a real one."""
+    global _client
+    with _lock:
+        _client = client
+
+def is_not_found(exc: BaseException) -> bool:
+    """True for the SDK's NotFoundError, without importing the SDK just to check."""
+    return type(exc).__name__ == "NotFoundError" or getattr(exc, "status_code", None) == 404
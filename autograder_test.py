@@ -1,21 +1,42 @@
-import subprocess, json, tempfile, shutil, sys, os
+import subprocess, json, tempfile, shutil, sys, os, fnmatch, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Optional, Iterable
-
-def _run(cmd, cwd: Path, timeout: int, env: Optional[dict] = None):
-    return subprocess.run(
-        cmd,
-        cwd=str(cwd),
-        capture_output=True,
-        text=True,
-        timeout=timeout,
-        check=False,
-        env=env,
-    )
+from typing import Optional, Iterable, Iterator
+
+from capture import HEAD_BYTES, TAIL_BYTES, run_bounded
+from grader_cache import BundleCache, SetupCache, bundle_sha256, relative_files, unshare
+from grader_metrics import PhaseTimer, emit_metrics, record_usage
+from junit_report import collect_test_records, parse_junit
+from pytest_pool import WarmPytestPool
+from result_cache import ResultCache
+from venv_cache import VenvCache
+
+def _run(cmd, cwd: Path, timeout: int, env: Optional[dict] = None, max_output: Optional[int] = None):
+    # Output is streamed into head+tail buffers, so a print loop can't balloon grader memory.
+    proc = run_bounded(cmd, cwd=cwd, timeout=timeout, env=env, max_output=max_output)
+    record_usage(proc)
+    return proc
+
+def _proc_fields(proc: subprocess.CompletedProcess) -> dict:
+    fields = {"returncode": proc.returncode, "stdout": proc.stdout[-(HEAD_BYTES + TAIL_BYTES):],
+              "stderr": proc.stderr[-(HEAD_BYTES + TAIL_BYTES):]}
+    if getattr(proc, "stdout_dropped", 0) or getattr(proc, "stderr_dropped", 0):
+        fields["stdout_dropped"] = proc.stdout_dropped
+        fields["stderr_dropped"] = proc.stderr_dropped
+    if getattr(proc, "output_limited", False):
+        fields["note"] = "Output limit exceeded; process killed."
+    return fields
 
 def _make_exec(path: Path):
     if path.exists():
-        try: path.chmod(path.stat().st_mode | 0o111)
+        try:
+            st = path.stat()
+            if st.st_mode & 0o111 == 0o111:
+                return
+            if st.st_nlink > 1:
+                unshare(path)  # hardlinked from a cache template; chmod would change the template too
+            path.chmod(path.stat().st_mode | 0o111)
         except Exception: pass
 
 def _find_singleton_root(work: Path) -> Path:
@@ -25,11 +46,59 @@ def _find_singleton_root(work: Path) -> Path:
 def _find_first(paths: Iterable[Path]) -> Optional[Path]:
     return next((p for p in paths if p.exists()), None)
 
-def _install_requirements(root: Path, timeout: int, result: dict):
-    candidates = list(root.glob("requirements*.txt")) + list(root.glob("requirements*.in"))
-    if not candidates:
-        candidates += list(root.glob("*/*/requirements*.txt")) + list(root.glob("*/*/requirements*.in"))
-    req = _find_first(sorted(candidates, key=lambda p: len(p.parts)))
+class _WorkspaceIndex:
+    """
+    One os.walk over the workspace. Entry points, requirements and tests are looked up here
+    (shallowest first) instead of each helper globbing the tree again.
+    """
+    def __init__(self, root: Path):
+        self.root = root
+        self.files: dict[str, list[Path]] = {}
+        self.dirs: dict[str, list[Path]] = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            base = Path(dirpath)
+            for d in dirnames:
+                self.dirs.setdefault(d, []).append(base / d)
+            for f in filenames:
+                self.files.setdefault(f, []).append(base / f)
+        for paths in (*self.files.values(), *self.dirs.values()):
+            paths.sort(key=lambda p: (len(p.parts), str(p)))
+
+    def _depth(self, p: Path) -> int:
+        return len(p.relative_to(self.root).parts)
+
+    def first_file(self, name: str) -> Optional[Path]:
+        return next(iter(self.files.get(name, [])), None)
+
+    def first_dir(self, name: str) -> Optional[Path]:
+        return next(iter(self.dirs.get(name, [])), None)
+
+    def matching(self, *patterns: str) -> list[Path]:
+        found = [p for name, paths in self.files.items() if any(fnmatch.fnmatch(name, pat) for pat in patterns)
+                 for p in paths]
+        return sorted(found, key=lambda p: (len(p.parts), str(p)))
+
+    def requirements(self) -> Optional[Path]:
+        # requirements*.txt / *.in at the root, else exactly two levels down (*/*/requirements*)
+        reqs = self.matching("requirements*.txt", "requirements*.in")
+        for depth in (1, 3):
+            at_depth = [p for p in reqs if self._depth(p) == depth]
+            if at_depth:
+                return sorted(at_depth, key=lambda p: p.suffix != ".txt")[0]
+        return None
+
+def _install_requirements(index: _WorkspaceIndex, timeout: int, result: dict,
+                          venv_cache: Optional[VenvCache] = None, stack: Optional[ExitStack] = None) -> str:
+    """Install the bundle's deps and return the interpreter the tests should run under."""
+    root = index.root
+    req = index.requirements()
+    if venv_cache is not None and stack is not None:
+        try:
+            return str(stack.enter_context(venv_cache.interpreter(req, timeout, log=result)))
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            result["venv_error"] = str(e)
+            return sys.executable
+
     if req:
         pip_cmd = [sys.executable, "-m", "pip", "install", "-r", str(req)]
     else:
@@ -39,16 +108,38 @@ def _install_requirements(root: Path, timeout: int, result: dict):
     result["pip_returncode"] = pip.returncode
     result["pip_stdout"] = pip.stdout[-4000:]
     result["pip_stderr"] = pip.stderr[-4000:]
+    return sys.executable
 
-def _collect_artifacts(root: Path, result: dict):
-    js = list(root.rglob("results.json"))
+def _artifact(name: str, run_dirs: list[Path], index: _WorkspaceIndex) -> Optional[Path]:
+    """Look where runners write artifacts (run dir, its results/ dir) before anything the bundle shipped."""
+    candidates = [d / name for d in run_dirs] + [d / "results" / name for d in run_dirs]
+    return _find_first(candidates + index.files.get(name, []))
+
+def _collect_artifacts(index: _WorkspaceIndex, result: dict, run_dirs: Iterable[Path] = ()):
+    run_dirs = list(dict.fromkeys([*run_dirs, index.root]))
+    js = _artifact("results.json", run_dirs, index)
     if js:
-        try: result["gradescope_results"] = json.loads(js[0].read_text(errors="ignore"))
+        try: result["gradescope_results"] = json.loads(js.read_text(errors="ignore"))
         except Exception as e: result["gradescope_results_error"] = str(e)
-    xml = list(root.rglob("report.xml"))
+    xml = _artifact("report.xml", run_dirs, index)
     if xml:
-        try: result["junit_xml"] = xml[0].read_text(errors="ignore")[-20000:]
-        except Exception as e: result["junit_xml_error"] = str(e)
+        # Parsed here, streaming, into compact per-test records rather than shipping the raw XML.
+        try: report = parse_junit(xml)
+        except Exception as e: result["junit_error"] = str(e)
+        else:
+            result["junit_tests"] = report["tests"]
+            result["junit_summary"] = report["summary"]
+            result.update({f"junit_{k}": report[k] for k in ("error", "omitted") if k in report})
+
+def _extract_bundle(zip_path: str, work: Path, timeout: int,
+                    bundle_cache: Optional[BundleCache]) -> subprocess.CompletedProcess:
+    if bundle_cache is None:
+        return _run(["unzip", "-q", zip_path, "-d", str(work)], cwd=work, timeout=timeout, env=os.environ.copy())
+    try:
+        bundle_cache.populate(zip_path, work, timeout=timeout)
+    except subprocess.CalledProcessError as e:
+        return subprocess.CompletedProcess(e.cmd, e.returncode, e.stdout or "", e.stderr or "")
+    return subprocess.CompletedProcess(["bundle-cache"], 0, "", "")
 
 def _copy_student(src_dir: Path, dst_root: Path) -> list[Path]:
     copied: list[Path] = []
@@ -56,29 +147,93 @@ def _copy_student(src_dir: Path, dst_root: Path) -> list[Path]:
         if p.is_file():
             dest = dst_root / p.relative_to(src_dir)
             dest.parent.mkdir(parents=True, exist_ok=True)
+            # Workspace files may be hardlinks into the bundle cache; never write through them.
+            dest.unlink(missing_ok=True)
             shutil.copy2(p, dest)
             copied.append(dest)
     return copied
 
-def _discover_tests(root: Path):
+def _discover_tests(index: _WorkspaceIndex):
     """
     Return (tests_dir, test_files)
     - If a tests dir exists (shallowest), return it and empty file list.
-    - Else return None and a non-empty list of discovered test files.
+    - Else return None and a non-empty list of discovered test files (shallowest first).
+    """
+    tests_dir = index.first_dir("tests")
+    if tests_dir:
+        return tests_dir, []
+    return None, index.matching("test_*.py", "*_test.py")
+
+GRADER_PLUGINS = Path(__file__).resolve().parent / "grader_plugins"
+
+def _grading_env(root: Path, work: Path, python: str = sys.executable) -> dict:
+    """
+    Per-run environment: imports resolve to this workspace (then the grader's per-test timeout plugin)
+    and temp files stay inside it.
     """
-    tests_dirs = sorted([p for p in root.rglob("tests") if p.is_dir()], key=lambda p: len(p.parts))
-    if tests_dirs:
-        return tests_dirs[0], []
-
-    # No tests dir; collect explicit test files
-    files = set()
-    for pattern in ("test_*.py", "*_test.py"):
-        for f in root.rglob(pattern):
-            if f.is_file():
-                files.add(f)
-    # Prefer shallower files first for determinism
-    files = sorted(files, key=lambda p: len(p.parts))
-    return None, files
+    env = os.environ.copy()
+    if python != sys.executable:
+        # Scripts calling python3/pip3 (run_autograder, setup.sh) pick up the bundle's venv.
+        venv_bin = str(Path(python).parent)
+        env["PATH"] = venv_bin + os.pathsep + env.get("PATH", "")
+        env["VIRTUAL_ENV"] = str(Path(venv_bin).parent)
+    inherited = [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+    env["PYTHONPATH"] = os.pathsep.join([str(root)] + inherited + [str(GRADER_PLUGINS)])
+    tmp = work / ".tmp"
+    tmp.mkdir(exist_ok=True)
+    for var in ("TMPDIR", "TEMP", "TMP"):
+        env[var] = str(tmp)
+    return env
+
+def _setup_snapshot_builder(zip_path: str, rel_setup: Path, python: str, timeout: int):
+    """Build a SetupCache entry: a fresh bundle tree with setup.sh run in it (raises if setup fails)."""
+    def build(staging: Path):
+        tree = staging / "tree"
+        tree.mkdir()
+        unzip_proc = _run(["unzip", "-q", zip_path, "-d", str(tree)], cwd=tree, timeout=timeout, env=os.environ.copy())
+        if unzip_proc.returncode != 0:
+            raise subprocess.CalledProcessError(unzip_proc.returncode, unzip_proc.args, unzip_proc.stdout, unzip_proc.stderr)
+        before = set(relative_files(tree))
+        setup_sh = tree / rel_setup
+        _make_exec(setup_sh)
+        env = _grading_env(_find_singleton_root(tree), staging, python)
+        proc = _run(["bash", str(setup_sh)], cwd=setup_sh.parent, timeout=timeout, env=env)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args, proc.stdout, proc.stderr)
+        shutil.rmtree(staging / ".tmp", ignore_errors=True)
+        (staging / "setup.json").write_text(json.dumps({
+            "stdout": proc.stdout[-8000:],
+            "stderr": proc.stderr[-8000:],
+            "removed": sorted(before - set(relative_files(tree))),
+        }))
+    return build
+
+def _run_setup(setup_sh: Path, work: Path, zip_path: str, python: str, timeout: int, env: dict,
+               setup_cache: Optional[SetupCache], student_copies: list[Path], result: dict) -> subprocess.CompletedProcess:
+    """Run setup.sh, or restore the workspace from the bundle's post-setup snapshot."""
+    if setup_cache is None:
+        return _run(["bash", str(setup_sh)], cwd=setup_sh.parent, timeout=timeout, env=env)
+    key = setup_cache.key(zip_path, python)
+    build = _setup_snapshot_builder(zip_path, setup_sh.relative_to(work), python, timeout)
+    try:
+        meta = setup_cache.restore(key, build, work, skip=set(student_copies))
+    except subprocess.CalledProcessError as e:
+        return subprocess.CompletedProcess(e.cmd, e.returncode, e.stdout or "", e.stderr or "")
+    result["setup_cache_hit"] = meta["setup_cache_hit"]
+    return subprocess.CompletedProcess(["bash", str(setup_sh)], 0, meta.get("stdout", ""), meta.get("stderr", ""))
+
+def _cacheable(result: dict) -> bool:
+    """
+    Only runs that completed normally are worth reusing. A timeout, an infrastructure failure
+    (unzip, pip, setup.sh) or a truncated run may well not happen next time.
+    """
+    if result.get("returncode") in (None, 7, 124) or result.get("note") or result.get("error"):
+        return False
+    if result.get("venv_error") or result.get("pip_returncode") not in (None, 0):
+        return False
+    if result.get("stdout_dropped") or result.get("stderr_dropped"):
+        return False
+    return not any(t["status"] == "timeout" for t in collect_test_records(result))
 
 def _uses_autograder_mount(script: Optional[Path]) -> bool:
     if not script or not script.exists():
@@ -91,16 +246,60 @@ def _uses_autograder_mount(script: Optional[Path]) -> bool:
 
 def run_autograder_zip(zip_path: str,
                        student_dir: Optional[str] = None,
-                       timeout: int = 180) -> dict:
+                       timeout: int = 180,
+                       install_deps: bool = True,
+                       bundle_cache: Optional[BundleCache] = None,
+                       venv_cache: Optional[VenvCache] = None,
+                       setup_cache: Optional[SetupCache] = None,
+                       pytest_pool: Optional[WarmPytestPool] = None,
+                       max_output_bytes: Optional[int] = None,
+                       result_cache: Optional[ResultCache] = None,
+                       test_timeout: Optional[float] = 30,
+                       metrics_log: Optional[str] = None) -> dict:
+    """
+    Grade student_dir against the autograder bundle at zip_path and return a result dict.
+    timeout bounds each phase (unzip, pip, setup, test run); test_timeout is the per-test budget
+    enforced inside the test runner, so one hanging test is recorded as a timeout and the rest still run.
+    If the run as a whole times out, the result has returncode 124 plus whatever artifacts were written.
+    result["timings"] / result["resources"] hold per-phase wall time, child CPU and peak RSS; with
+    metrics_log (or CODEASSIST_METRICS_LOG) each run also appends them to that file as a JSON line.
+    """
+    metrics_log = metrics_log or os.environ.get("CODEASSIST_METRICS_LOG")
+    if result_cache is not None and not result_cache.bypassed(zip_path):
+        # Identical bundle + identical student files + same limits: reuse the stored result.
+        started = time.perf_counter()
+        key = result_cache.key(zip_path, student_dir, timeout=timeout, max_output_bytes=max_output_bytes,
+                               test_timeout=test_timeout)
+        cached = result_cache.get(key)
+        if cached is not None:
+            elapsed = round(time.perf_counter() - started, 4)
+            cached.update({"timings": {"result_cache": elapsed, "total": elapsed}, "resources": {}})
+            cached.setdefault("bundle_sha256", bundle_sha256(zip_path))
+            emit_metrics(metrics_log, zip_path, student_dir, cached)
+            return cached
+        result = run_autograder_zip(zip_path, student_dir, timeout, install_deps, bundle_cache, venv_cache,
+                                    setup_cache, pytest_pool, max_output_bytes, test_timeout=test_timeout,
+                                    metrics_log=metrics_log)
+        if _cacheable(result):
+            result_cache.put(key, result)
+        return result
+
     work = Path(tempfile.mkdtemp(prefix="grader_"))
+    stack = ExitStack()
     result = {"returncode": None, "stdout": "", "stderr": ""}
+    timer = PhaseTimer(result)
+    index: Optional[_WorkspaceIndex] = None
 
     zip_path = str(Path(zip_path).resolve())
     student_dir = str(Path(student_dir).resolve()) if student_dir else None
 
     try:
-        # 1) Unzip
-        unzip_proc = _run(["unzip", "-q", zip_path, "-d", str(work)], cwd=work, timeout=timeout, env=os.environ.copy())
+        # Lets stored runs be scoped to the exact bundle they were graded against.
+        try: result["bundle_sha256"] = bundle_sha256(zip_path)
+        except OSError: pass  # missing bundle: unzip reports it below
+        # 1) Unzip (or clone the cached pristine copy of this bundle)
+        with timer.phase("extract"):
+            unzip_proc = _extract_bundle(zip_path, work, timeout, bundle_cache)
         result["unzip_returncode"] = unzip_proc.returncode
         if unzip_proc.returncode != 0:
             result.update({
@@ -114,20 +313,27 @@ def run_autograder_zip(zip_path: str,
 
         # 2) Copy student code (optional)
         student_copies: list[Path] = []
-        if student_dir:
-            student_copies = _copy_student(Path(student_dir), root)
+        with timer.phase("copy_student"):
+            if student_dir:
+                student_copies = _copy_student(Path(student_dir), root)
+            index = _WorkspaceIndex(root)
+        run_dir = root
 
-        # 3) Install deps
-        _install_requirements(root, timeout, result)
+        # 3) Install deps (batch mode installs once up front instead); with a venv cache this is a lookup
+        python = sys.executable
+        if install_deps or venv_cache is not None:
+            with timer.phase("install"):
+                python = _install_requirements(index, timeout, result, venv_cache, stack)
 
         # 4) Prefer entrypoints
-        run_autograder = _find_first(sorted(root.rglob("run_autograder"), key=lambda p: len(p.parts)))
-        setup_sh       = _find_first(sorted(root.rglob("setup.sh"), key=lambda p: len(p.parts)))
-        run_tests_py   = _find_first(sorted(root.rglob("run_tests.py"), key=lambda p: len(p.parts)))
+        run_autograder = index.first_file("run_autograder")
+        setup_sh       = index.first_file("setup.sh")
+        run_tests_py   = index.first_file("run_tests.py")
 
         # Ensure imports see the workspace
-        env = os.environ.copy()
-        env["PYTHONPATH"] = str(root) + (os.pathsep + env.get("PYTHONPATH", ""))
+        env = _grading_env(root, work, python)
+        if test_timeout:
+            env["GRADER_TEST_TIMEOUT"] = str(test_timeout)  # picked up by unittest runners via sitecustomize
 
         if student_copies:
             # Prefer top-level Python files that originated from the student submission.
@@ -138,26 +344,35 @@ def run_autograder_zip(zip_path: str,
                 env.setdefault("FILENAME", str(student_py[0]))
 
         if run_autograder and not _uses_autograder_mount(run_autograder):
+            run_dir = run_autograder.parent
             _make_exec(run_autograder)
-            proc = _run([str(run_autograder)], cwd=run_autograder.parent, timeout=timeout, env=env)
-            result.update({"returncode": proc.returncode, "stdout": proc.stdout[-8000:], "stderr": proc.stderr[-8000:]})
-            _collect_artifacts(root, result)
+            with timer.phase("tests"):
+                proc = _run([str(run_autograder)], cwd=run_autograder.parent, timeout=timeout, env=env, max_output=max_output_bytes)
+            result.update(_proc_fields(proc))
+            with timer.phase("artifacts"):
+                _collect_artifacts(index, result, [run_autograder.parent])
             return result
 
         if setup_sh and run_tests_py and not _uses_autograder_mount(run_tests_py):
+            run_dir = setup_sh.parent
             _make_exec(setup_sh)
-            s1 = _run(["bash", str(setup_sh)], cwd=setup_sh.parent, timeout=timeout, env=env)
+            with timer.phase("setup"):
+                s1 = _run_setup(setup_sh, work, zip_path, python, timeout, env, setup_cache, student_copies, result)
             if s1.returncode != 0:
-                result.update({"returncode": s1.returncode, "stdout": s1.stdout[-8000:], "stderr": s1.stderr[-8000:], "note": "setup.sh failed"})
-                _collect_artifacts(root, result)
+                result.update({**_proc_fields(s1), "note": "setup.sh failed"})
+                with timer.phase("artifacts"):
+                    _collect_artifacts(index, result, [setup_sh.parent])
                 return result
-            t1 = _run([sys.executable, str(run_tests_py)], cwd=run_tests_py.parent, timeout=timeout, env=env)
-            result.update({"returncode": t1.returncode, "stdout": t1.stdout[-8000:], "stderr": t1.stderr[-8000:]})
-            _collect_artifacts(root, result)
+            run_dir = run_tests_py.parent
+            with timer.phase("tests"):
+                t1 = _run([python, str(run_tests_py)], cwd=run_tests_py.parent, timeout=timeout, env=env, max_output=max_output_bytes)
+            result.update(_proc_fields(t1))
+            with timer.phase("artifacts"):
+                _collect_artifacts(index, result, [run_tests_py.parent])
             return result
 
         # 5) Fallback: discover tests anywhere; run them explicitly
-        tests_dir, test_files = _discover_tests(root)
+        tests_dir, test_files = _discover_tests(index)
         if tests_dir:
             pytest_cwd = root
             try:
@@ -165,11 +380,11 @@ def run_autograder_zip(zip_path: str,
                 target = str(rel_tests)
             except ValueError:
                 target = str(tests_dir)
-            cmd = ["pytest", "-q", "--disable-warnings", "--junitxml", "report.xml", target]
+            cmd = [python, "-m", "pytest", "-q", "--disable-warnings", "--junitxml", "report.xml", target]
         elif test_files:
             pytest_cwd = root
             # Pass explicit file list so pytest definitely runs something
-            cmd = ["pytest", "-q", "--disable-warnings", "--junitxml", "report.xml"] + [str(p) for p in test_files]
+            cmd = [python, "-m", "pytest", "-q", "--disable-warnings", "--junitxml", "report.xml"] + [str(p) for p in test_files]
         else:
             result.update({
                 "returncode": 5,
@@ -178,18 +393,124 @@ def run_autograder_zip(zip_path: str,
             })
             return result
 
+        if test_timeout:
+            env.pop("GRADER_TEST_TIMEOUT", None)
+            cmd[3:3] = ["-p", "grader_timeouts", "--test-timeout", str(test_timeout)]
+
         try:
             result["workspace_listing"] = sorted(str(p.relative_to(root)) for p in root.iterdir())
         except Exception:
             result["workspace_listing_error"] = "Failed to list workspace"
 
-        proc = _run(cmd, cwd=pytest_cwd, timeout=timeout, env=env)
-        result.update({"returncode": proc.returncode, "stdout": proc.stdout[-8000:], "stderr": proc.stderr[-8000:]})
-        _collect_artifacts(root, result)
+        with timer.phase("tests"):
+            if pytest_pool is not None:
+                proc = pytest_pool.run(python, zip_path, bundle_sha256(zip_path), cmd[3:], cwd=pytest_cwd, env=env,
+                                       timeout=timeout, max_output=max_output_bytes)
+                record_usage(proc)
+            else:
+                proc = _run(cmd, cwd=pytest_cwd, timeout=timeout, env=env, max_output=max_output_bytes)
+        result.update(_proc_fields(proc))
+        with timer.phase("artifacts"):
+            _collect_artifacts(index, result, [pytest_cwd])
+        return result
+
+    except subprocess.TimeoutExpired as e:
+        # Keep what the run produced before it was killed: output tails and any JUnit/Gradescope files.
+        result.update({
+            "returncode": 124,
+            "stdout": (e.output or "")[-(HEAD_BYTES + TAIL_BYTES):] if isinstance(e.output, str) else "",
+            "stderr": (e.stderr or "")[-(HEAD_BYTES + TAIL_BYTES):] if isinstance(e.stderr, str) else "",
+            "note": f"Timed out after {e.timeout}s: {' '.join(map(str, e.cmd))[:200]}",
+        })
+        if index is not None:
+            with timer.phase("artifacts"):
+                _collect_artifacts(index, result, [run_dir])
         return result
 
     finally:
+        stack.close()
         shutil.rmtree(work, ignore_errors=True)
+        timer.finish()
+        emit_metrics(metrics_log, zip_path, student_dir, result)
+
+# -------- Batch grading --------
+def _submission_dirs(submissions_dir: Path) -> list[Path]:
+    return sorted(p for p in submissions_dir.iterdir() if p.is_dir() and not p.name.startswith((".", "__")))
+
+def _install_bundle_requirements(zip_path: str, timeout: int, bundle_cache: Optional[BundleCache],
+                                 venv_cache: Optional[VenvCache]) -> dict:
+    """
+    Install the bundle's requirements once so batch workers don't race pip on one interpreter.
+    With a venv cache this builds the shared venv, so workers only ever hit it.
+    """
+    work = Path(tempfile.mkdtemp(prefix="grader_deps_"))
+    result: dict = {}
+    try:
+        unzip_proc = _extract_bundle(zip_path, work, timeout, bundle_cache)
+        if unzip_proc.returncode != 0:
+            return result
+        with ExitStack() as stack:
+            _install_requirements(_WorkspaceIndex(_find_singleton_root(work)), timeout, result, venv_cache, stack)
+        return result
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+_worker_caches: dict = {}
+
+def _batch_worker_init(caches: dict, warm_pytest: bool):
+    # Workers only ever see their own workspace on PYTHONPATH.
+    os.environ.pop("PYTHONPATH", None)
+    _worker_caches.update(caches)
+    if warm_pytest:
+        _worker_caches["pytest_pool"] = WarmPytestPool()
+
+def _grade_submission(zip_path: str, student_dir: str, timeout: int, options: dict) -> dict:
+    try:
+        result = run_autograder_zip(zip_path, student_dir, timeout=timeout, install_deps=False,
+                                    **options, **_worker_caches)
+    except Exception as e:
+        result = {"returncode": None, "stdout": "", "stderr": "", "error": f"{type(e).__name__}: {e}"}
+    result["submission"] = Path(student_dir).name
+    return result
+
+def run_autograder_batch(zip_path: str,
+                         submissions_dir: str,
+                         workers: Optional[int] = None,
+                         timeout: int = 180,
+                         bundle_cache: Optional[BundleCache] = None,
+                         venv_cache: Optional[VenvCache] = None,
+                         setup_cache: Optional[SetupCache] = None,
+                         warm_pytest: bool = False,
+                         max_output_bytes: Optional[int] = None,
+                         result_cache: Optional[ResultCache] = None,
+                         test_timeout: Optional[float] = 30,
+                         metrics_log: Optional[str] = None) -> Iterator[dict]:
+    """
+    Grade every submission folder in submissions_dir against one bundle.
+    Yields result dicts (tagged with "submission") in completion order.
+    With a bundle cache, the bundle is extracted once and each run copies (reflinks) its workspace from it;
+    with a venv cache, every run shares one venv built from the bundle's requirements;
+    with a setup cache, setup.sh runs once per bundle instead of once per submission;
+    with warm_pytest, each worker keeps a pytest server with the bundle's test deps preloaded;
+    with a result cache, unchanged resubmissions return their stored result without running anything;
+    with metrics_log, every run appends its phase timings to that file as a JSON line.
+    """
+    zip_path = str(Path(zip_path).resolve())
+    submissions = _submission_dirs(Path(submissions_dir).resolve())
+    if not submissions:
+        return
+    deps = _install_bundle_requirements(zip_path, timeout, bundle_cache, venv_cache)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(submissions)))
+    options = {"max_output_bytes": max_output_bytes, "test_timeout": test_timeout, "metrics_log": metrics_log}
+    caches = {"bundle_cache": bundle_cache, "venv_cache": venv_cache, "setup_cache": setup_cache,
+              "result_cache": result_cache}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init, initargs=(caches, warm_pytest)) as pool:
+        futures = [pool.submit(_grade_submission, zip_path, str(s), timeout, options) for s in submissions]
+        for fut in as_completed(futures):
+            result = fut.result()
+            result.update({k: v for k, v in deps.items() if k == "pip_returncode"})
+            yield result
 
 # -------- Example --------
 if __name__ == "__main__":
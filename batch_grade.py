@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import sys
+
+from pathlib import Path
+
+from autograder_test import run_autograder_batch
+from grader_cache import BundleCache, SetupCache, default_cache_dir
+from result_cache import ResultCache
+from result_store import ResultStore
+from venv_cache import VenvCache
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Grade a directory of submissions against one autograder bundle.")
+    parser.add_argument("--zip", required=True, help="Autograder bundle (.zip).")
+    parser.add_argument("--submissions", required=True, help="Directory with one sub-folder per submission.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of grading processes.")
+    parser.add_argument("--timeout", type=int, default=180, help="Per-submission timeout in seconds.")
+    parser.add_argument("--test-timeout", type=float, default=30, help="Per-test budget in seconds (0 disables).")
+    parser.add_argument("--max-output-mb", type=float, default=None, help="Kill a run once it prints this much.")
+    parser.add_argument("--cache-dir", default=str(default_cache_dir("bundles")), help="Extracted-bundle cache directory.")
+    parser.add_argument("--no-bundle-cache", action="store_true", help="Unzip the bundle for every submission.")
+    parser.add_argument("--hardlink-cache", action="store_true",
+                        help="Hardlink bundle/setup cache files into workspaces instead of copying them. Faster, "
+                             "but only safe when graders don't run as root: a write would reach the cached copy.")
+    parser.add_argument("--venv-dir", default=str(default_cache_dir("venvs")), help="Requirements venv cache directory.")
+    parser.add_argument("--no-venv-cache", action="store_true", help="pip install into this interpreter instead.")
+    parser.add_argument("--setup-dir", default=str(default_cache_dir("setup")), help="Post-setup.sh snapshot directory.")
+    parser.add_argument("--no-setup-cache", action="store_true", help="Run setup.sh for every submission.")
+    parser.add_argument("--result-cache", action="store_true", help="Reuse stored results for unchanged submissions.")
+    parser.add_argument("--result-dir", default=str(default_cache_dir("results")), help="Result cache directory.")
+    parser.add_argument("--result-ttl-hours", type=float, default=24 * 7, help="Result cache entry lifetime.")
+    parser.add_argument("--flaky", action="append", default=[], help="Bundle name or sha256 never served from the result cache.")
+    parser.add_argument("--warm-pytest", action="store_true", help="Run pytest in preloaded per-worker servers.")
+    parser.add_argument("--wheelhouse", default=None, help="Install from this wheel directory only (offline hosts).")
+    parser.add_argument("--metrics-log", default=None, help="Append per-run phase timings here as JSON lines.")
+    parser.add_argument("--store", default=None, help="Also record results in this SQLite result store.")
+    parser.add_argument("--assignment", default=None, help="Assignment name for the store (default: zip name).")
+    parser.add_argument("--output", default="-", help="JSONL output file ('-' for stdout).")
+    return parser.parse_args()
+
+#--------- Main ---------#
+if __name__ == "__main__":
+    args = parse_args()
+    out = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    try:
+        link_mode = "hardlink" if args.hardlink_cache else "copy"
+        bundle_cache = None if args.no_bundle_cache else BundleCache(Path(args.cache_dir), link_mode=link_mode)
+        venv_cache = None if args.no_venv_cache else VenvCache(Path(args.venv_dir), wheelhouse=args.wheelhouse)
+        setup_cache = None if args.no_setup_cache else SetupCache(Path(args.setup_dir), link_mode=link_mode)
+        result_cache = (ResultCache(Path(args.result_dir), ttl=args.result_ttl_hours * 3600, bypass=args.flaky)
+                        if args.result_cache else None)
+        store = ResultStore(Path(args.store)) if args.store else None
+        assignment = args.assignment or Path(args.zip).stem
+        pending: list[tuple] = []
+        for result in run_autograder_batch(args.zip, args.submissions, workers=args.workers, timeout=args.timeout,
+                                          bundle_cache=bundle_cache, venv_cache=venv_cache, setup_cache=setup_cache,
+                                          warm_pytest=args.warm_pytest,
+                                          max_output_bytes=int(args.max_output_mb * 2**20) if args.max_output_mb else None,
+                                          result_cache=result_cache, test_timeout=args.test_timeout,
+                                          metrics_log=args.metrics_log):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            print(f"graded {result.get('submission')}: returncode={result.get('returncode')}", file=sys.stderr)
+            if store is not None:
+                pending.append((assignment, result["submission"], result))
+                if len(pending) >= 50:  # one transaction per chunk keeps up with the workers
+                    store.add_runs(pending)
+                    pending.clear()
+        if store is not None:
+            store.add_runs(pending)
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,52 @@
+"""
+Import-time budget for the API-facing modules: each is imported in a fresh interpreter (so nothing
+is cached in sys.modules) and the median must stay under --budget-ms. Also checks that importing
+does not pull in the anthropic SDK or dotenv.
+
+    python benchmarks/import_time.py --budget-ms 150
+"""
+import argparse, json, statistics, subprocess, sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+MODULES = ["claude_test", "claude_prompt", "feedback_stream"]
+HEAVY = ["anthropic", "dotenv", "httpx"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(module: str, runs: int) -> dict:
+    samples, heavy = [], set()
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)], cwd=REPO,
+                              capture_output=True, text=True, env={"PATH": "/usr/bin:/bin", "HOME": str(Path.home())})
+        if proc.returncode != 0:
+            raise SystemExit(f"importing {module} failed:\n{proc.stderr}")
+        out = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(out["ms"])
+        heavy.update(out["heavy"])
+    return {"module": module, "median_ms": round(statistics.median(samples), 2),
+            "max_ms": round(max(samples), 2), "heavy_imports": sorted(heavy)}
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check module import time against a fixed budget.")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Max median import time per module.")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh interpreters per module.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    return parser.parse_args()
+
+#--------- Main ---------#
+if __name__ == "__main__":
+    args = parse_args()
+    failed = False
+    for module in args.modules:
+        r = measure(module, args.runs)
+        ok = r["median_ms"] <= args.budget_ms and not r["heavy_imports"]
+        failed |= not ok
+        print(json.dumps({**r, "budget_ms": args.budget_ms, "ok": ok}))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,226 @@
+"""
+End-to-end throughput benchmark over assignment-examples.
+
+For each assignment, N synthetic submissions (mutated copies of the reference solution) are graded
+with run_autograder_batch; every result is then formatted for the prompt and "uploaded" through
+claude_test with an in-process fake client. Reports p50/p95/p99 per phase, submissions/second and
+peak memory, and optionally compares against a stored baseline:
+
+    python benchmarks/pipeline.py -n 20 --save-baseline benchmarks/baseline.json
+    python benchmarks/pipeline.py -n 20 --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import argparse, ast, json, random, resource, shutil, sys, tempfile, threading, time
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+import claude_test
+from anthropic_client import set_client
+from autograder_test import run_autograder_batch
+from grader_cache import BundleCache, SetupCache
+from rate_limit import RateLimiter
+from venv_cache import VenvCache
+
+ASSIGNMENTS = {
+    "A1": "calculator.py",
+    "A2": "spiral.py",
+    "A3": "intervals.py",
+    "A4": "WordSearch.py",
+}
+
+# -------- Synthetic submissions --------
+_FLIP = {ast.Lt: ast.LtE, ast.LtE: ast.Lt, ast.Gt: ast.GtE, ast.GtE: ast.Gt, ast.Eq: ast.NotEq, ast.NotEq: ast.Eq}
+
+class _Mutator(ast.NodeTransformer):
+    """Applies one random off-by-one style change: flip a comparison or nudge an integer constant."""
+    def __init__(self, rng: random.Random, target: int):
+        self.rng, self.target, self.seen = rng, target, 0
+
+    def _hit(self) -> bool:
+        self.seen += 1
+        return self.seen == self.target
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if type(node.ops[0]) in _FLIP and self._hit():
+            node.ops[0] = _FLIP[type(node.ops[0])]()
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, int) and not isinstance(node.value, bool) and self._hit():
+            return ast.copy_location(ast.Constant(node.value + self.rng.choice((-1, 1))), node)
+        return node
+
+def mutate(source: str, rng: random.Random) -> str:
+    """Reference solution (1 in 4), a syntax error (1 in 10), or one semantic mutation."""
+    roll = rng.random()
+    if roll < 0.25:
+        return source
+    if roll < 0.35:
+        lines = source.splitlines()
+        lines.insert(rng.randrange(len(lines) + 1), "def broken(:")
+        return "\n".join(lines) + "\n"
+    tree = ast.parse(source)
+    sites = sum(1 for n in ast.walk(tree) if isinstance(n, ast.Compare) or
+                (isinstance(n, ast.Constant) and isinstance(n.value, int) and not isinstance(n.value, bool)))
+    if not sites:
+        return source
+    tree = _Mutator(rng, rng.randint(1, sites)).visit(tree)
+    return ast.unparse(ast.fix_missing_locations(tree)) + "\n"
+
+def make_submissions(assignment_dir: Path, solution: str, n: int, dest: Path, seed: int) -> Path:
+    rng = random.Random(seed)
+    source = (assignment_dir / solution).read_text()
+    for i in range(n):
+        sub = dest / f"sub{i:04d}"
+        sub.mkdir(parents=True)
+        (sub / solution).write_text(mutate(source, rng))
+    return dest
+
+# -------- Fake Anthropic client --------
+class _FakeFiles:
+    def __init__(self, latency: float):
+        self.latency, self.count, self._lock = latency, 0, threading.Lock()
+
+    def upload(self, file, extra_headers=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.count += 1
+            return SimpleNamespace(id=f"file_{self.count:08d}", filename=file[0])
+
+    def retrieve_metadata(self, file_id, extra_headers=None):
+        time.sleep(self.latency)
+        return SimpleNamespace(id=file_id)
+
+    def delete(self, file_id, extra_headers=None):
+        time.sleep(self.latency)
+        return SimpleNamespace(id=file_id, type="file_deleted")
+
+class FakeClient:
+    """Just enough of client.beta for the upload and cleanup paths, with a fixed per-call latency."""
+    def __init__(self, latency: float = 0.02):
+        self.beta = SimpleNamespace(files=_FakeFiles(latency))
+
+# -------- Stats --------
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+def summarize(samples: dict[str, list[float]]) -> dict:
+    return {phase: {"n": len(v), "p50": round(percentile(v, 50), 4), "p95": round(percentile(v, 95), 4),
+                    "p99": round(percentile(v, 99), 4)} for phase, v in sorted(samples.items()) if v}
+
+def peak_rss_mb() -> dict:
+    to_mb = 1 / 1024
+    return {"self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * to_mb, 1),
+            "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * to_mb, 1)}
+
+# -------- Benchmark --------
+def bench_assignment(name: str, n: int, workers: int, seed: int, cache_root: Path, scratch: Path,
+                     timeout: int = 60, test_timeout: float = 5) -> dict:
+    assignment_dir = REPO / "assignment-examples" / name
+    zip_path = next(assignment_dir.glob("*.zip"), None)
+    subs = make_submissions(assignment_dir, ASSIGNMENTS[name], n, scratch / name, seed)
+    samples: dict[str, list[float]] = {}
+
+    def add(phase: str, seconds: float):
+        samples.setdefault(phase, []).append(seconds)
+
+    results: list[dict] = []
+    started = time.perf_counter()
+    if zip_path is not None:
+        for r in run_autograder_batch(str(zip_path), str(subs), workers=workers, timeout=timeout, test_timeout=test_timeout,
+                                      bundle_cache=BundleCache(cache_root / "bundles"),
+                                      venv_cache=VenvCache(),  # shared default cache: deps are not what's measured
+                                      setup_cache=SetupCache(cache_root / "setup")):
+            results.append(r)
+            for phase, seconds in (r.get("timings") or {}).items():
+                add(f"grade.{phase}", seconds)
+    grade_wall = time.perf_counter() - started
+    if zip_path is None:
+        # No autograder bundle for this assignment: format/upload a minimal result per submission.
+        results = [{"returncode": 0, "stdout": "", "stderr": "", "submission": s.name} for s in sorted(subs.iterdir())]
+
+    for r in results:
+        t = time.perf_counter()
+        claude_test.FormatAutograderResults(r)
+        add("format", time.perf_counter() - t)
+        t = time.perf_counter()
+        claude_test.UploadFiles(subs / r["submission"], "*.py", inline_threshold=0)
+        claude_test.UploadAutograderResults(r, inline_threshold=0)
+        add("upload", time.perf_counter() - t)
+    claude_test.DeleteRunFiles()
+
+    return {
+        "submissions": len(results),
+        "graded": zip_path is not None,
+        "grade_wall_s": round(grade_wall, 3),
+        "submissions_per_s": round(len(results) / grade_wall, 3) if zip_path is not None and grade_wall else None,
+        "returncodes": {str(rc): sum(1 for r in results if r.get("returncode") == rc)
+                        for rc in sorted({r.get("returncode") for r in results}, key=str)},
+        "phases": summarize(samples),
+    }
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regressions: p50/p95 more than threshold slower, or throughput more than threshold lower."""
+    problems = []
+    for name, cur in report["assignments"].items():
+        base = baseline.get("assignments", {}).get(name)
+        if not base:
+            continue
+        for phase, stats in cur["phases"].items():
+            old = base["phases"].get(phase)
+            for q in ("p50", "p95"):
+                # Sub-millisecond phases are noise; only flag them past an absolute floor as well.
+                if old and stats[q] > old[q] * (1 + threshold) and stats[q] - old[q] > 0.005:
+                    problems.append(f"{name} {phase} {q}: {old[q]}s -> {stats[q]}s")
+        if base.get("submissions_per_s") and cur.get("submissions_per_s") and \
+                cur["submissions_per_s"] < base["submissions_per_s"] * (1 - threshold):
+            problems.append(f"{name} throughput: {base['submissions_per_s']}/s -> {cur['submissions_per_s']}/s")
+    return problems
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark grading, formatting and upload over assignment-examples.")
+    parser.add_argument("-n", "--submissions", type=int, default=20, help="Synthetic submissions per assignment.")
+    parser.add_argument("--assignments", nargs="*", default=list(ASSIGNMENTS), help="Subset of A1..A4.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=60, help="Per-submission timeout; mutations can loop forever.")
+    parser.add_argument("--test-timeout", type=float, default=5, help="Per-test budget in seconds.")
+    parser.add_argument("--upload-latency", type=float, default=0.02, help="Fake Files API latency per call (s).")
+    parser.add_argument("--baseline", default=None, help="Compare against this stored report.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%).")
+    parser.add_argument("--save-baseline", default=None, help="Write this run's report here.")
+    return parser.parse_args()
+
+#--------- Main ---------#
+if __name__ == "__main__":
+    args = parse_args()
+    set_client(FakeClient(args.upload_latency))
+    claude_test.file_id_cache = None  # measure real upload round trips, not cache hits
+    claude_test.rate_limiter = RateLimiter(requests_per_minute=None, input_tokens_per_minute=None,
+                                           initial_concurrency=32, max_concurrency=32)  # no account limits to respect
+    scratch = Path(tempfile.mkdtemp(prefix="bench_"))
+    try:
+        report = {"submissions_per_assignment": args.submissions, "workers": args.workers, "assignments": {}}
+        for i, name in enumerate(args.assignments):
+            report["assignments"][name] = bench_assignment(name, args.submissions, args.workers, args.seed + i,
+                                                           scratch / "cache", scratch / "subs",
+                                                           args.timeout, args.test_timeout)
+            print(f"{name}: {json.dumps(report['assignments'][name]['phases'].get('grade.total', {}))}", file=sys.stderr)
+        report["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for p in problems:
+            print("REGRESSION:", p, file=sys.stderr)
+        sys.exit(1 if problems else 0)
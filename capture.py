@@ -0,0 +1,144 @@
+import os, resource, selectors, signal, subprocess, time
+from pathlib import Path
+from typing import Optional
+
+HEAD_BYTES = 2000
+TAIL_BYTES = 8000
+
+class BoundedBuffer:
+    """Keeps the first `head` and last `tail` bytes of a stream; everything in between is only counted."""
+    def __init__(self, head: int = HEAD_BYTES, tail: int = TAIL_BYTES):
+        self.head_limit, self.tail_limit = head, tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self.tail += chunk
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        data = bytes(self.head)
+        if self.dropped:
+            data += f"\n... [{self.dropped} bytes dropped] ...\n".encode()
+        data += bytes(self.tail)
+        return data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+def rusage_dict(ru, child: bool = True) -> dict:
+    """CPU seconds and peak RSS of one reaped process; child=False if it isn't our own child."""
+    return {"user_s": ru.ru_utime, "sys_s": ru.ru_stime, "maxrss_kb": ru.ru_maxrss, "child": child}
+
+class CapturedProcess(subprocess.CompletedProcess):
+    """
+    CompletedProcess whose stdout/stderr are head+tail excerpts, with counts of what was dropped
+    and the process's own resource usage (from wait4) when known.
+    """
+    def __init__(self, args, returncode, stdout: BoundedBuffer, stderr: BoundedBuffer, output_limited: bool = False,
+                 usage: Optional[dict] = None):
+        super().__init__(args, returncode, stdout.text(), stderr.text())
+        self.stdout_dropped = stdout.dropped
+        self.stderr_dropped = stderr.dropped
+        self.output_limited = output_limited
+        self.usage = usage
+
+def limit_file_size(max_bytes: int, pid: int = 0):
+    """Cap RLIMIT_FSIZE for pid (0 = this process); children inherit it."""
+    try: resource.prlimit(pid, resource.RLIMIT_FSIZE, (max_bytes, max_bytes))
+    except (OSError, ValueError): pass
+
+def _reap(proc: subprocess.Popen, timeout: Optional[float]):
+    """waitpid via wait4 so the child's rusage comes back with its exit status."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        pid, status, ru = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return ru
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.02)
+
+def _kill_group(proc: subprocess.Popen):
+    try: os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError): proc.kill()
+
+def run_bounded(cmd, cwd: Path, timeout: float, env: Optional[dict] = None,
+                max_output: Optional[int] = None) -> CapturedProcess:
+    """
+    Like subprocess.run(capture_output=True, text=True) but reads the pipes incrementally into
+    bounded buffers. If max_output (stdout+stderr bytes) is exceeded the process group is killed early;
+    max_output also caps the size of any file the process writes (pytest captures test output in
+    temp files, not our pipes), which kills it with SIGXFSZ.
+    Raises subprocess.TimeoutExpired (carrying the captured excerpts) on timeout.
+    """
+    proc = subprocess.Popen(cmd, cwd=str(cwd), env=env, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    if max_output is not None:
+        limit_file_size(max_output, pid=proc.pid)
+    bufs = {proc.stdout: BoundedBuffer(), proc.stderr: BoundedBuffer()}
+    sel = selectors.DefaultSelector()
+    for pipe in bufs:
+        os.set_blocking(pipe.fileno(), False)
+        sel.register(pipe, selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout
+    limited = timed_out = False
+    try:
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in sel.select(timeout=min(remaining, 1.0)):
+                chunk = os.read(key.fileobj.fileno(), 65536)
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    continue
+                bufs[key.fileobj].feed(chunk)
+            if max_output is not None and sum(b.total for b in bufs.values()) > max_output:
+                limited = True
+                break
+        if timed_out or limited:
+            _kill_group(proc)
+        try:
+            ru = _reap(proc, max(0.1, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_group(proc)
+            ru = _reap(proc, None)
+    finally:
+        sel.close()
+        proc.stdout.close()
+        proc.stderr.close()
+    out, err = bufs[proc.stdout], bufs[proc.stderr]
+    limited = limited or proc.returncode == -signal.SIGXFSZ
+    if timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout, output=out.text(), stderr=err.text())
+    return CapturedProcess(cmd, proc.returncode, out, err, output_limited=limited, usage=rusage_dict(ru))
+
+def read_bounded(path: Path, head: int = HEAD_BYTES, tail: int = TAIL_BYTES) -> BoundedBuffer:
+    """Head+tail excerpt of a file without reading the middle."""
+    buf = BoundedBuffer(head, tail)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            buf.head += f.read(head)
+            if size > head:
+                f.seek(max(head, size - tail))
+                buf.tail += f.read(tail)
+            buf.total = size
+    except FileNotFoundError:
+        pass
+    return buf
@@ -1,20 +1,19 @@
 # ------------------- Prompt builder -------------------
-def build_codeassist_prompt(*, assignment_description: str, language: str,
-                            autograder_results: str = "All tests passed",
-                            past_coding_insights: list[str] | None = None) -> str:
-    insights_text = ""
-    if past_coding_insights:
-        insights_text = "\n".join(f"- {b}" for b in past_coding_insights)
+# The prompt is split so everything shared by an assignment's submissions (instructions, assignment
+# description, test files) forms one prefix that prompt caching can reuse across students.
 
+def build_codeassist_static_prompt(*, assignment_description: str, language: str) -> str:
+    """Instructions and assignment context; identical for every student of an assignment."""
     return f"""
         You are an AI code reviewer integrated into CodeAssist for a CS course.
 
         Context you will receive:
           - Assignment description: {assignment_description}
-          - Student code: attached as one or more documents
-          - Autograder results (summary):\n{autograder_results}
+          - Language: {language}
+          - Autograder test files: attached as documents right after these instructions (when available)
+          - Student code: attached as one or more documents after the test files
           - Full autograder results file may be attached as: autograder_results.json
-          - Past coding insights for this student: {insights_text if insights_text else "(none)"}
+          - Autograder results (summary) and past coding insights for this student: in the final message block
 
         Primary focus:
           - Diagnose algorithmic and logical flaws — especially those causing wrong answers, runtime errors, timeouts, or excessive complexity.
@@ -44,3 +43,27 @@ def build_codeassist_prompt(*, assignment_description: str, language: str,
           ]
         }}
     """
+
+def build_codeassist_student_prompt(*, autograder_results: str = "All tests passed",
+                                    past_coding_insights: list[str] | None = None) -> str:
+    """Per-student context; goes after the student's documents."""
+    insights_text = ""
+    if past_coding_insights:
+        insights_text = "\n".join(f"- {b}" for b in past_coding_insights)
+
+    return f"""
+        Autograder results (summary):
+{autograder_results}
+
+        Past coding insights for this student:
+{insights_text if insights_text else "(none)"}
+
+        Review the attached student code and return only the JSON described above.
+    """
+
+def build_codeassist_prompt(*, assignment_description: str, language: str,
+                            autograder_results: str = "All tests passed",
+                            past_coding_insights: list[str] | None = None) -> str:
+    return (build_codeassist_static_prompt(assignment_description=assignment_description, language=language)
+            + build_codeassist_student_prompt(autograder_results=autograder_results,
+                                              past_coding_insights=past_coding_insights))
@@ -1,58 +1,139 @@
 import argparse
 import json
 import os
+import random
+import re
 import tempfile
+import threading
+import time
 import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-import xml.etree.ElementTree as ET
 
-from anthropic import Anthropic
-from dotenv import load_dotenv
+from anthropic_client import get_client, is_not_found
+from claude_prompt import build_codeassist_static_prompt, build_codeassist_student_prompt
+from feedback_stream import FeedbackStreamParser
+from file_id_cache import FileIdCache
+from insight_index import InsightIndex
+from junit_report import collect_test_records
+from rate_limit import RateLimiter
+from result_store import ResultStore
 
-from autograder_test import run_autograder_zip
-from claude_prompt import build_codeassist_prompt
-
-load_dotenv() # Environment variables
-client = Anthropic(
-    api_key=os.environ["ANTHROPIC_API_KEY"],   # use ANTHROPIC_API_KEY
-)
+# Every API call goes through one limiter (request/token buckets, AIMD concurrency, retries), so
+# uploads, feedback and cleanup share one view of the account's capacity.
+rate_limiter = RateLimiter.from_env()
 
 #--------- Upload Files ----------#
-def UploadFiles ( path: Path, pattern: str ) :
-    path = Path(path)
-    uploaded_files = []
-    # Find all files matching pattern
-    for file in path.rglob(pattern):
-        with open( file, "rb" ) as f:
-            uploaded = client.beta.files.upload(
-                file=(file.name, f, "text/plain"),
-                extra_headers={"anthropic-beta": "files-api-2025-04-14"}, # Have to include this to work
-            )
-        uploaded_files.append(uploaded.id)
-
-    return uploaded_files
-
-def UploadAutograderResults(results: dict, filename: str = "autograder_results.json") -> str:
-    """Upload full autograder results as a file to Claude Files API and return file_id."""
-    serialized = json.dumps(results, indent=2)
-    with tempfile.NamedTemporaryFile(mode="w+", suffix=".json", prefix="autograder_", delete=False) as tmp:
-        tmp.write(serialized)
-        tmp.flush()
-        tmp_path = Path(tmp.name)
+# Uploads share the one client (and its HTTP connection pool) across a bounded set of threads.
+UPLOAD_CONCURRENCY = int(os.environ.get("CODEASSIST_UPLOAD_CONCURRENCY", "8"))
+
+# Process-wide cap on uploads in flight: the Upload* helpers run side by side (and UploadFiles has
+# its own pool), so per-call pool sizes alone would multiply. Resized by set_upload_concurrency().
+_upload_slots = threading.BoundedSemaphore(UPLOAD_CONCURRENCY)
+
+def set_upload_concurrency(n: int):
+    global _upload_slots
+    _upload_slots = threading.BoundedSemaphore(max(1, n))
+
+# Identical files (same name + content) map to one remote file_id across runs; None uploads every time.
+file_id_cache: FileIdCache | None = None if os.environ.get("CODEASSIST_FILE_CACHE") == "0" else FileIdCache()
+
+class RunUploads:
+    """file_ids this run uploaded outside the file_id cache; cleanup deletes exactly these."""
+    def __init__(self):
+        self._ids: list[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, file_id: str):
+        with self._lock:
+            self._ids.append(file_id)
+
+    def take(self) -> list[str]:
+        with self._lock:
+            ids, self._ids = self._ids, []
+        return ids
+
+run_uploads = RunUploads()
+
+def _file_exists(file_id: str) -> bool:
     try:
-        with open(tmp_path, "rb") as f:
-            # Only PDF and plaintext documents are supported for document blocks.
-            # Upload as text/plain so it can be attached in a message.
-            uploaded = client.beta.files.upload(
-                file=(filename, f, "text/plain"),
-                extra_headers={"anthropic-beta": "files-api-2025-04-14"},
-            )
-        return uploaded.id
-    finally:
+        rate_limiter.call(lambda: get_client().beta.files.retrieve_metadata(
+            file_id, extra_headers={"anthropic-beta": "files-api-2025-04-14"}))
+        return True
+    except Exception as e:
+        if is_not_found(e):
+            return False
+        raise
+
+# Text files up to this many bytes are sent inline as document blocks instead of a Files API round trip.
+INLINE_THRESHOLD = int(os.environ.get("CODEASSIST_INLINE_BYTES", "16384"))
+
+# Per-run numbers printed at the end of __main__ (how each document was attached, ...).
+run_metrics: dict = {"documents": []}
+_metrics_lock = threading.Lock()
+
+def _record_document(filename: str, size: int, mode: str):
+    with _metrics_lock:
+        run_metrics["documents"].append({"filename": filename, "bytes": size, "mode": mode})
+
+def _inline_document(filename: str, text: str) -> dict:
+    return {
+        "type": "document",
+        "source": { "type": "text", "media_type": "text/plain", "data": text },
+        "title": filename,
+    }
+
+def _attach(filename: str, data: bytes, inline_threshold: int) -> str | dict:
+    """A file_id for an uploaded file, or an inline document block for small text."""
+    if len(data) <= inline_threshold:
         try:
-            tmp_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            text = None
+        if text is not None:
+            _record_document(filename, len(data), "inline")
+            return _inline_document(filename, text)
+
+    def upload() -> str:
+        with _upload_slots:
+            uploaded = rate_limiter.call(lambda: get_client().beta.files.upload(
+                file=(filename, data, "text/plain"),
+                extra_headers={"anthropic-beta": "files-api-2025-04-14"}, # Have to include this to work
+            ))
+        return uploaded.id
+
+    _record_document(filename, len(data), "file")
+    if file_id_cache is None:
+        file_id = upload()
+        run_uploads.add(file_id)
+        return file_id
+    # Cached uploads outlive this run; the cache hands back the ones it retires via drain_orphans().
+    return file_id_cache.get_or_upload(filename, data, upload, _file_exists)
+
+def UploadFiles ( path: Path, pattern: str, max_concurrency: int = UPLOAD_CONCURRENCY,
+                  inline_threshold: int = INLINE_THRESHOLD ) :
+    """
+    Attach every file under path matching pattern, in sorted path order: files over inline_threshold
+    bytes are uploaded (file_id), smaller text files come back as inline document blocks.
+    """
+    path = Path(path)
+    # Find all files matching pattern
+    files = sorted(p for p in path.rglob(pattern) if p.is_file())
+
+    def attach(file: Path) -> str | dict:
+        return _attach(file.name, file.read_bytes(), inline_threshold)
+
+    if len(files) <= 1 or max_concurrency <= 1:
+        return [attach(file) for file in files]
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(files))) as pool:
+        return list(pool.map(attach, files))
+
+def UploadAutograderResults(results: dict, filename: str = "autograder_results.json",
+                            inline_threshold: int = INLINE_THRESHOLD) -> str | dict:
+    """Attach full autograder results: a Files API file_id, or an inline document block if small."""
+    # Only PDF and plaintext documents are supported for document blocks.
+    # Upload as text/plain so it can be attached in a message.
+    return _attach(filename, json.dumps(results, indent=2).encode(), inline_threshold)
 
 def _singleton_root(extracted_dir: Path) -> Path:
     entries = [p for p in extracted_dir.iterdir()]
@@ -60,14 +141,15 @@ def _singleton_root(extracted_dir: Path) -> Path:
         return entries[0]
     return extracted_dir
 
-def UploadAutograderTests(zip_path: Path) -> list[str]:
-    uploaded: list[str] = []
+def UploadAutograderTests(zip_path: Path, max_concurrency: int = UPLOAD_CONCURRENCY,
+                          inline_threshold: int = INLINE_THRESHOLD) -> list[str | dict]:
+    uploaded: list[str | dict] = []
     with tempfile.TemporaryDirectory(prefix="autograder_tests_") as tmpdir:
         tmpdir_path = Path(tmpdir)
         with zipfile.ZipFile(zip_path, "r") as zf:
             zf.extractall(tmpdir_path)
         root = _singleton_root(tmpdir_path)
-        uploaded.extend(UploadFiles(root, "*.py"))
+        uploaded.extend(UploadFiles(root, "*.py", max_concurrency, inline_threshold))
     return uploaded
 
 def _truncate(s: str, limit: int) -> str:
@@ -75,99 +157,49 @@ def _truncate(s: str, limit: int) -> str:
         return s
     return s[:limit] + "\n... [truncated]"
 
-def _format_gradescope_section(gr: dict, budget: int) -> str:
-    lines: list[str] = []
-    score = gr.get("score")
-    max_score = gr.get("max_score") or None
-    exec_time = gr.get("execution_time")
-    if score is not None:
-        if max_score is not None:
-            lines.append(f"Gradescope Score: {score}/{max_score}")
-        else:
-            lines.append(f"Gradescope Score: {score}")
-    if exec_time is not None:
-        lines.append(f"Execution Time: {exec_time}")
-    tests = gr.get("tests") or []
-    if tests:
-        lines.append("Tests:")
-        for t in tests:
-            name = t.get("name", "(unnamed)")
-            status = t.get("status", "unknown")
-            tscore = t.get("score")
-            tmax = t.get("max_score")
-            header = f"- [{status}] {name}"
-            if tscore is not None and tmax is not None:
-                header += f" — {tscore}/{tmax}"
-            elif tscore is not None:
-                header += f" — {tscore}"
-            lines.append(header)
-            out = t.get("output")
-            if isinstance(out, str) and out.strip():
-                # indent output and truncate per-test to keep readable
-                out_trunc = _truncate(out.strip(), max(200, min(1200, budget // max(1, len(tests)))))
-                for ln in out_trunc.splitlines():
-                    lines.append(f"  > {ln}")
-    return "\n".join(lines)
-
-def _parse_junit(xml_text: str) -> list[dict]:
-    tests: list[dict] = []
-    if not xml_text:
-        return tests
-    try:
-        root = ET.fromstring(xml_text)
-    except Exception:
-        return tests
-
-    for tc in root.iter("testcase"):
-        classname = tc.attrib.get("classname", "")
-        name = tc.attrib.get("name", "")
-        time = tc.attrib.get("time", "")
-        status = "passed"
-        msg = ""
-        err = tc.find("error")
-        if err is not None:
-            status = "error"
-            msg = (err.attrib.get("message") or (err.text or "")).strip()
-        fail = tc.find("failure")
-        if fail is not None:
-            status = "failed"
-            msg = (fail.attrib.get("message") or (fail.text or "")).strip()
-        skip = tc.find("skipped")
-        if skip is not None:
-            status = "skipped"
-            if not msg:
-                msg = (skip.attrib.get("message") or (skip.text or "")).strip()
-        tests.append({
-            "classname": classname,
-            "name": name,
-            "time": time,
-            "status": status,
-            "message": msg,
-        })
-    return tests
-
-def _format_junit_section(junit_xml: str, budget: int) -> str:
-    cases = _parse_junit(junit_xml)
-    if not cases:
-        return ""
-    lines: list[str] = [f"JUnit Testcases ({len(cases)}):"]
-    per_test_budget = max(120, min(800, budget // max(1, len(cases))))
-    for c in cases:
-        label = f"{c.get('classname','')}::{c.get('name','')}".strip(":")
-        status = (c.get("status") or "unknown").upper()
-        time = c.get("time") or ""
-        header = f"- [{status}] {label}"
-        if time:
-            header += f" ({time}s)"
-        lines.append(header)
-        msg = c.get("message") or ""
-        if msg:
-            for ln in (msg if isinstance(msg, str) else str(msg)).splitlines():
-                lines.append(f"  > {ln}")
-    return "\n".join(lines)
-
-def FormatAutograderResults(results: dict, limit: int = 12000) -> str:
-    """Produce a compact, readable summary for the prompt, prioritizing test info."""
+def _tail(s: str, limit: int) -> str:
+    if len(s) <= limit:
+        return s
+    return "... [truncated]\n" + s[-limit:]
+
+# ~4 characters per token for English text and code; close enough for budgeting without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _normalize_message(msg: str) -> str:
+    # Identical failures differ only in object addresses / whitespace; group them together.
+    return re.sub(r"\s+", " ", re.sub(r"0x[0-9a-fA-F]+", "0x?", msg)).strip()
+
+def _group_failures(records: list[dict]) -> list[dict]:
+    groups: dict[tuple, dict] = {}
+    for r in records:
+        key = (r["status"], _normalize_message(r["message"]))
+        g = groups.setdefault(key, {"status": r["status"], "message": r["message"], "names": []})
+        g["names"].append(r["name"])
+    # Messages shared by the most tests first: they explain the most failures per token.
+    return sorted(groups.values(), key=lambda g: -len(g["names"]))
+
+# The largest groups (ranked first) split half the budget by rank before the rest share what is left,
+# so a long tail of one-off failures can't reduce them to bare names.
+TOP_GROUPS = 3
+
+def _format_group(g: dict, max_tokens: int) -> str:
+    names = g["names"]
+    shown = ", ".join(names[:5]) + (f", ... (+{len(names) - 5} more)" if len(names) > 5 else "")
+    header = f"- [{g['status'].upper()}" + (f" x{len(names)}" if len(names) > 1 else "") + f"] {shown}"
+    room = (max_tokens - _tokens(header)) * CHARS_PER_TOKEN
+    if not g["message"] or room < 80:
+        return header
+    return header + "\n" + "\n".join(f"  > {ln}" for ln in _truncate(g["message"], room).splitlines())
+
+def FormatAutograderResults(results: dict, token_budget: int = 3000) -> str:
+    """
+    Summarize results for the prompt within roughly token_budget tokens, most useful first:
+    header and counts, failures/errors (identical messages merged, with counts), timeouts,
+    stderr/stdout tails, then the names of passing tests.
+    """
     parts: list[str] = []
     # Top-level return code / notes
     rc = results.get("returncode")
@@ -176,36 +208,76 @@ def FormatAutograderResults(results: dict, limit: int = 12000) -> str:
         parts.append(f"Return code: {rc}")
     if note:
         parts.append(f"Note: {note}")
-
-    # Prefer explicit gradescope-style results if available
     gr = results.get("gradescope_results")
     if isinstance(gr, dict):
-        parts.append(_format_gradescope_section(gr, budget=limit // 2))
-    elif isinstance(results.get("tests"), list):
-        parts.append(_format_gradescope_section(results, budget=limit // 2))
-
-    # Include explicit JUnit testcases list if present so users can see every test
-    junit_xml = results.get("junit_xml") or ""
-    junit_section = _format_junit_section(junit_xml, budget=limit // 2)
-    if junit_section:
-        parts.append(junit_section)
-
-    # Add stdout/stderr tails
-    stdout = results.get("stdout") or ""
-    stderr = results.get("stderr") or ""
-    if stdout:
-        parts.append("Stdout (tail):\n" + _truncate(stdout, 2000))
-    if stderr:
-        parts.append("Stderr (tail):\n" + _truncate(stderr, 2000))
+        if gr.get("score") is not None:
+            parts.append(f"Gradescope Score: {gr['score']}" + (f"/{gr['max_score']}" if gr.get("max_score") else ""))
+        if gr.get("execution_time") is not None:
+            parts.append(f"Execution Time: {gr['execution_time']}")
+
+    records = collect_test_records(results)
+    by_status: dict[str, list[dict]] = {}
+    for r in records:
+        by_status.setdefault(r["status"], []).append(r)
+    if records:
+        counts = ", ".join(f"{len(v)} {k}" for k, v in sorted(by_status.items(), key=lambda kv: kv[0] == "passed"))
+        parts.append(f"Tests: {len(records)} total ({counts})")
+    remaining = token_budget - sum(_tokens(p) for p in parts)
+
+    # Failures and errors, then timeouts: the top groups first, then a fair share of what is left each.
+    for title, statuses in (("Failures", ("failed", "error")), ("Timeouts", ("timeout",))):
+        groups = _group_failures([r for r in records if r["status"] in statuses])
+        if not groups or remaining <= 0:
+            continue
+        lines = [f"{title} ({len(groups)} distinct):"]
+        remaining -= _tokens(lines[0])
+        top = TOP_GROUPS if len(groups) > TOP_GROUPS else 0
+        # Fixed up front and weighted by rank (3:2:1 of half the budget, never below an even split);
+        # later groups are capped at the share before them, so shares never grow down the ranking.
+        weights = sum(range(1, top + 1))
+        fair = remaining // len(groups)
+        top_shares = [max(40, fair, remaining // 2 * (top - i) // weights) for i in range(top)]
+        share = remaining
+        for i, g in enumerate(groups):
+            if remaining <= 10:
+                lines.append(f"- ... {len(groups) - i} more omitted")
+                break
+            if i < top:
+                share = min(top_shares[i], remaining)
+            else:
+                share = min(share, max(40, remaining // (len(groups) - i)))
+            text = _format_group(g, min(share, remaining))
+            remaining -= _tokens(text)
+            lines.append(text)
+        parts.append("\n".join(lines))
+
+    # Passing test names come last but keep a small reserve, so output tails can't crowd them out entirely.
+    passed = [r["name"] for r in by_status.get("passed", [])]
+    passed_text = "Passed: " + ", ".join(passed) if passed else ""
+    reserve = min(_tokens(passed_text), token_budget // 10) if passed else 0
+    remaining -= reserve
+
+    # Output tails: the end of stderr usually holds the traceback that matters.
+    for label, key in (("Stderr", "stderr"), ("Stdout", "stdout")):
+        text = (results.get(key) or "").strip()
+        if text and remaining > 20:
+            text = _tail(text, min(len(text), (remaining - 5) * CHARS_PER_TOKEN))
+            parts.append(f"{label} (tail):\n{text}")
+            remaining -= _tokens(parts[-1])
+
+    remaining += reserve
+    if passed_text and remaining > 10:
+        parts.append(_truncate(passed_text, remaining * CHARS_PER_TOKEN))
 
     # Fallback to raw JSON when little content was collected
     summary = "\n\n".join(p for p in parts if p)
     if not summary.strip():
         raw = json.dumps(results, indent=2)
-        return _truncate(raw, limit)
-    return _truncate(summary, limit)
+        return _truncate(raw, token_budget * CHARS_PER_TOKEN)
+    return summary
 
 def run_assignment_autograder(assignment_dir: Path, autograder_zip: Path) -> tuple[str, dict]:
+    from autograder_test import run_autograder_zip
     results = run_autograder_zip(
         zip_path=str(autograder_zip),
         student_dir=str(assignment_dir),
@@ -217,42 +289,296 @@ def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Run Claude review with autograder context.")
     parser.add_argument("--assignment", default="A4", help="Assignment folder inside assignment-examples/")
     parser.add_argument("--skip-upload-tests", action="store_true", help="Skip uploading autograder test files.")
+    parser.add_argument("--no-file-cache", action="store_true", help="Upload every file instead of reusing cached file ids.")
+    parser.add_argument("--inline-bytes", type=int, default=INLINE_THRESHOLD,
+                        help="Send text files up to this size inline instead of uploading them (0 = always upload).")
+    parser.add_argument("--upload-concurrency", type=int, default=UPLOAD_CONCURRENCY, help="Max uploads in flight at once.")
+    parser.add_argument("--stream", action="store_true", help="Stream feedback and print each hint as it arrives.")
+    parser.add_argument("--student", default=None, help="Student id for the result store (default: assignment folder name).")
+    parser.add_argument("--store", default=None, help="SQLite result store path (default: CODEASSIST_RESULT_DB or the cache dir).")
+    parser.add_argument("--no-store", action="store_true", help="Don't record results and feedback.")
+    parser.add_argument("--insight-tokens", type=int, default=300, help="Token budget for past insights in the prompt.")
+    parser.add_argument("--bulk", default=None,
+                        help="Directory of submission folders: grade them all and get feedback in one Message Batch.")
+    parser.add_argument("--base-url", default=None,
+                        help="API base URL, e.g. a local fake_anthropic.py server (default: ANTHROPIC_BASE_URL or the real API).")
     return parser.parse_args()
 
 #--------- Claude Feedback ---------#
-def ClaudeFeedback ( file_ids: list[str], prompt_text: str ) :
-    content = [ { "type": "text", "text": prompt_text } ]
-
+def _document_block(doc: str | dict) -> dict:
+    if isinstance(doc, dict):
+        return doc
+    return { "type": "document", "source": { "type": "file", "file_id": doc } }
+
+def _describe(docs: list[str | dict]) -> list[str]:
+    return [d if isinstance(d, str) else f"inline:{d.get('title')}" for d in docs]
+
+CACHE_BREAKPOINT = { "type": "ephemeral" }
+
+def _feedback_content(file_ids: list[str | dict], prompt_text: str, static_prompt: str = "",
+                      static_file_ids: list[str | dict] = ()) -> list[dict]:
+    """
+    Static, per-assignment material first (instructions, test files), each group ending in a cache
+    breakpoint so later students reuse the cached prefix; per-student documents and text after it.
+    """
+    content: list[dict] = []
+    if static_prompt:
+        content.append({ "type": "text", "text": static_prompt })
+    # Add document block for each test file
+    content.extend(_document_block(f) for f in static_file_ids)
+    if content:
+        content[-1] = { **content[-1], "cache_control": CACHE_BREAKPOINT }
     # Add document block for each file id
-    for f in file_ids:
-        content.append({
-            "type": "document",
-            "source": { "type": "file", "file_id": f }
-        })
-
-    response = client.beta.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1200,
-        messages=[{"role": "user", "content": content}],
+    content.extend(_document_block(f) for f in file_ids)
+    content.append({ "type": "text", "text": prompt_text })
+    return content
+
+def _record_usage(response, elapsed: float | None = None):
+    usage = getattr(response, "usage", None)
+    fields = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+    with _metrics_lock:
+        totals = run_metrics.setdefault("usage", { f: 0 for f in fields })
+        for f in fields:
+            totals[f] += getattr(usage, f, None) or 0
+        if elapsed is not None:
+            run_metrics.setdefault("feedback_seconds", []).append(round(elapsed, 3))
+
+def _input_tokens(content: list[dict]) -> int:
+    """Rough input size for the token bucket; Files API documents are unknown here and count as 0."""
+    return _tokens(json.dumps(content))
+
+def _settle_tokens(estimate: int, response):
+    """Charge the token bucket the actual input tokens (cache reads don't count against the limit)."""
+    usage = getattr(response, "usage", None)
+    actual = (getattr(usage, "input_tokens", None) or 0) + (getattr(usage, "cache_creation_input_tokens", None) or 0)
+    if actual:
+        rate_limiter.tokens.debit(actual - estimate)
+
+def _feedback_params(content: list[dict]) -> dict:
+    return {
+        "model": "claude-sonnet-4-20250514",
+        "max_tokens": 1200,
+        "messages": [{"role": "user", "content": content}],
+    }
+
+def ClaudeFeedback ( file_ids: list[str | dict], prompt_text: str, static_prompt: str = "",
+                     static_file_ids: list[str | dict] = () ) :
+    """
+    file_ids holds Files API ids and/or inline document blocks from the Upload* helpers.
+    static_prompt / static_file_ids are the per-assignment parts, sent first and prompt-cached.
+    """
+    content = _feedback_content(file_ids, prompt_text, static_prompt, static_file_ids)
+
+    estimate = _input_tokens(content)
+    started = time.perf_counter()
+    response = rate_limiter.call(lambda: get_client().beta.messages.create(
+        **_feedback_params(content),
         betas=["files-api-2025-04-14"],
-    )
+    ), input_tokens=estimate)
+    _record_usage(response, time.perf_counter() - started)
+    _settle_tokens(estimate, response)
 
     return response
 
-#--------- Delete All Uploaded Files ---------#
-def DeleteAllFiles () :
-    files_to_delete = []
-    files = client.beta.files.list(extra_headers={"anthropic-beta": "files-api-2025-04-14"})
-    for page in files:
-        files_to_delete.append([page.filename, page.id])
+def ClaudeFeedbackStream ( file_ids: list[str | dict], prompt_text: str, static_prompt: str = "",
+                           static_file_ids: list[str | dict] = (), on_item=None ) :
+    """
+    Like ClaudeFeedback, but streams the reply and calls on_item(key, item) for each insight
+    ("insights", str) and annotation ("annotations", dict) as soon as it is complete.
+    Returns the final message.
+    """
+    content = _feedback_content(file_ids, prompt_text, static_prompt, static_file_ids)
+    estimate = _input_tokens(content)
+    first_item = None
+    emitted = 0  # items already passed to on_item, so a retried stream doesn't repeat them
+
+    def stream_once():
+        nonlocal first_item, emitted
+        parser, seen = FeedbackStreamParser(), 0
+        with get_client().beta.messages.stream(
+            **_feedback_params(content),
+            betas=["files-api-2025-04-14"],
+        ) as stream:
+            for delta in stream.text_stream:
+                for key, item in parser.feed(delta):
+                    seen += 1
+                    if seen <= emitted:
+                        continue
+                    emitted = seen
+                    if first_item is None:
+                        first_item = time.perf_counter() - started
+                    if on_item is not None:
+                        on_item(key, item)
+            return stream.get_final_message()
+
+    started = time.perf_counter()
+    response = rate_limiter.call(stream_once, input_tokens=estimate)
+    _record_usage(response, time.perf_counter() - started)
+    _settle_tokens(estimate, response)
+    if first_item is not None:
+        with _metrics_lock:
+            run_metrics.setdefault("first_item_seconds", []).append(round(first_item, 3))
+
+    return response
 
-    for f in files_to_delete:
-        result = client.beta.files.delete(f[1],extra_headers={"anthropic-beta": "files-api-2025-04-14"})
-        print(f"Filename: {f[0]}, Result: {result}")
+def _failing_tests(results: dict) -> list[str]:
+    return [t["name"] for t in collect_test_records(results) if t["status"] != "passed"]
+
+def PastInsights ( insights: InsightIndex | None, student: str, assignment: str, results: dict,
+                   token_budget: int = 300 ) -> list[str] :
+    """Prior insights for this student most relevant to the assignment and its failing tests."""
+    if insights is None:
+        return []
+    return insights.retrieve(student, assignment, _failing_tests(results), token_budget=token_budget)
+
+def _feedback_json(response) -> dict | None:
+    """The {"insights", "annotations"} object from a feedback message, if it parses."""
+    text = "".join(getattr(b, "text", "") for b in getattr(response, "content", None) or [])
+    parser = FeedbackStreamParser()
+    for _ in parser.feed(text):
+        pass
+    return parser.result()
+
+#--------- Bulk Feedback (Message Batches) ---------#
+def _custom_ids(keys: list[str]) -> dict[str, str]:
+    """custom_id -> key; custom ids must match [A-Za-z0-9_-]{1,64} and be unique within a batch."""
+    return { f"s{i:05d}-{re.sub(r'[^A-Za-z0-9_-]', '_', k)[:50]}": k for i, k in enumerate(keys) }
+
+def ClaudeFeedbackBatch ( requests: dict[str, list[dict]], poll_interval: float = 5.0,
+                          max_poll_interval: float = 60.0, timeout: float = 24 * 3600 ) -> dict :
+    """
+    Send one Message Batch with a feedback request per key (content from _feedback_content), poll
+    with jittered exponential backoff until it ends, and return {key: message} for succeeded
+    requests and {key: result} (errored/canceled/expired) for the rest.
+    """
+    if not requests:
+        return {}
+    ids = _custom_ids(list(requests))
+    keys = {key: cid for cid, key in ids.items()}
+    started = time.perf_counter()
+    batch = rate_limiter.call(lambda: get_client().beta.messages.batches.create(
+        requests=[{ "custom_id": keys[key], "params": _feedback_params(content) } for key, content in requests.items()],
+        betas=["files-api-2025-04-14"],
+    ))
+    delay = poll_interval
+    while batch.processing_status != "ended":
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Message batch {batch.id} still {batch.processing_status} after {timeout}s")
+        time.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 1.5, max_poll_interval)
+        batch = rate_limiter.call(lambda: get_client().beta.messages.batches.retrieve(batch.id, betas=["files-api-2025-04-14"]))
+
+    responses: dict = {}
+    # Fetched in full under the limiter: a 429 midway would otherwise lose every finished result.
+    entries = rate_limiter.call(lambda: list(get_client().beta.messages.batches.results(batch.id, betas=["files-api-2025-04-14"])))
+    for entry in entries:
+        key = ids.get(entry.custom_id)
+        if key is None:
+            continue
+        if entry.result.type == "succeeded":
+            responses[key] = entry.result.message
+            _record_usage(entry.result.message)
+        else:
+            responses[key] = entry.result
+    with _metrics_lock:
+        run_metrics["batch_seconds"] = round(time.perf_counter() - started, 3)
+    return responses
+
+def BulkFeedback ( autograder_zip: Path, submissions_dir: Path, static_prompt: str,
+                   static_file_ids: list[str | dict] = (), max_concurrency: int = UPLOAD_CONCURRENCY,
+                   inline_threshold: int = INLINE_THRESHOLD, store: ResultStore | None = None,
+                   insights: InsightIndex | None = None, insight_tokens: int = 300 ) -> dict :
+    """
+    Grade every submission folder, attach its files and results, and get all feedback in one batch.
+    With a store, each run is recorded as it is graded and its feedback JSON once the batch ends;
+    with an insight index, past insights go into each prompt and new ones are recorded.
+    """
+    from autograder_test import run_autograder_batch
+    requests: dict[str, list[dict]] = {}
+    run_ids: dict[str, int] = {}
+    assignment = Path(autograder_zip).stem
+    for results in run_autograder_batch(str(autograder_zip), str(submissions_dir)):
+        name = results["submission"]
+        print(f"graded {name}: returncode={results.get('returncode')}")
+        if store is not None:
+            run_ids[name] = store.add_run(assignment, name, results)
+        docs = UploadFiles(Path(submissions_dir) / name, "*.py", max_concurrency, inline_threshold)
+        docs.append(UploadAutograderResults(results, inline_threshold=inline_threshold))
+        prompt = build_codeassist_student_prompt(
+            autograder_results=FormatAutograderResults(results),
+            past_coding_insights=PastInsights(insights, name, assignment, results, insight_tokens)
+        )
+        requests[name] = _feedback_content(docs, prompt, static_prompt, static_file_ids)
+    responses = ClaudeFeedbackBatch(requests)
+    for name in requests:
+        feedback = _feedback_json(responses.get(name))
+        if feedback is None:
+            continue
+        if store is not None:
+            store.set_feedback(run_ids[name], feedback)
+        if insights is not None:
+            insights.add(name, assignment, feedback.get("insights") or [], run_ids.get(name))
+    return responses
+
+#--------- Delete This Run's Files ---------#
+CLEANUP_CONCURRENCY = int(os.environ.get("CODEASSIST_CLEANUP_CONCURRENCY", "8"))
+_cleanup_pool: ThreadPoolExecutor | None = None
+
+def _delete_file(file_id: str) -> bool | None:
+    """True once deleted, False if it was already gone, None if the delete failed."""
+    try:
+        rate_limiter.call(lambda: get_client().beta.files.delete(file_id, extra_headers={"anthropic-beta": "files-api-2025-04-14"}))
+    except Exception as e:
+        if is_not_found(e):
+            return False
+        with _metrics_lock:
+            run_metrics.setdefault("cleanup_errors", []).append(f"{file_id}: {type(e).__name__}: {e}"[:300])
+        return None
+    return True
+
+def _delete_files(file_ids: list[str], max_concurrency: int, orphans: set[str] = frozenset()) -> dict[str, bool]:
+    if not file_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(file_ids)))) as pool:
+        outcomes = dict(zip(file_ids, pool.map(_delete_file, file_ids)))
+    # Failed ids go back where they came from, so the next cleanup retries them instead of leaking them.
+    failed = [i for i, ok in outcomes.items() if ok is None]
+    for file_id in failed:
+        if file_id not in orphans:
+            run_uploads.add(file_id)
+    if file_id_cache is not None:
+        file_id_cache.add_orphans([i for i in failed if i in orphans])
+    return {i: bool(ok) for i, ok in outcomes.items()}
+
+def DeleteRunFiles ( file_ids: list[str] | None = None, max_concurrency: int = CLEANUP_CONCURRENCY,
+                     background: bool = False ) -> dict[str, bool] | Future :
+    """
+    Delete the files this run uploaded (default: everything recorded in run_uploads) plus any the
+    file_id cache has expired or evicted; never anything else in the account. Returns
+    {file_id: deleted}, or with background=True a Future for it so the caller can move on.
+    Deletes that fail (after the limiter's retries) are tracked again for the next call.
+    """
+    ids = run_uploads.take() if file_ids is None else list(file_ids)
+    orphans = set(file_id_cache.drain_orphans()) if file_id_cache is not None else set()
+    ids = list(dict.fromkeys(ids + sorted(orphans)))
+    if not background:
+        return _delete_files(ids, max_concurrency, orphans)
+    global _cleanup_pool
+    if _cleanup_pool is None:
+        # Executor threads are joined at interpreter exit, so queued deletes still finish.
+        _cleanup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cleanup")
+    return _cleanup_pool.submit(_delete_files, ids, max_concurrency, orphans)
 
 #--------- Main ---------#
 if __name__ == "__main__":
     args = parse_args()
+    if args.base_url:
+        os.environ["ANTHROPIC_BASE_URL"] = args.base_url  # read when the client is first built
+    if args.no_file_cache:
+        file_id_cache = None
+    set_upload_concurrency(args.upload_concurrency)
+    store = None if args.no_store else ResultStore(args.store)
+    insights = None if args.no_store else InsightIndex(args.store)
 
     assignment_path = Path("assignment-examples") / args.assignment
     if not assignment_path.exists() or not assignment_path.is_dir():
@@ -262,44 +588,81 @@ if __name__ == "__main__":
     if not autograder_zip:
         raise SystemExit(f"No autograder zip found in {assignment_path}")
 
+    if args.bulk:
+        test_file_ids = [] if args.skip_upload_tests else UploadAutograderTests(autograder_zip, args.upload_concurrency,
+                                                                                args.inline_bytes)
+        static_prompt = build_codeassist_static_prompt(assignment_description="", language="Python 3.11")
+        responses = BulkFeedback(autograder_zip, Path(args.bulk), static_prompt, test_file_ids,
+                                 args.upload_concurrency, args.inline_bytes, store, insights, args.insight_tokens)
+        for name in sorted(responses):
+            print(f"--- {name} ---")
+            print(responses[name])
+        deleted = DeleteRunFiles()
+        print(f"Deleted {sum(deleted.values())}/{len(deleted)} uploaded files")
+        run_metrics["rate_limit"] = rate_limiter.stats()
+        print("Run metrics:", json.dumps(run_metrics))
+        raise SystemExit(0)
+
     print(f"Running autograder for {assignment_path}...")
     autograder_results_text, raw_results = run_assignment_autograder(assignment_path, autograder_zip)
     print("Autograder completed with return code:", raw_results.get("returncode"))
+    student = args.student or assignment_path.name
+    run_id = store.add_run(autograder_zip.stem, student, raw_results) if store is not None else None
+
+    # Upload student code, autograder tests and full results at the same time
+    with ThreadPoolExecutor(max_workers=3) as uploads:
+        student_job = uploads.submit(UploadFiles, assignment_path, "*.py", args.upload_concurrency, args.inline_bytes)
+        tests_job = None
+        if not args.skip_upload_tests:
+            print("Uploading autograder tests for reference...")
+            tests_job = uploads.submit(UploadAutograderTests, autograder_zip, args.upload_concurrency, args.inline_bytes)
+        # Upload full autograder results as a document so Claude can access 100% of details
+        results_job = uploads.submit(UploadAutograderResults, raw_results, inline_threshold=args.inline_bytes)
+
+        file_ids = student_job.result()
+        print("Uploaded student files:", _describe(file_ids))
+        test_file_ids: list[str | dict] = tests_job.result() if tests_job else []
+        if tests_job:
+            print("Uploaded autograder test files:", _describe(test_file_ids))
+        try:
+            results_file_id = results_job.result()
+            print("Uploaded autograder results file:", _describe([results_file_id])[0])
+        except Exception as e:
+            print("Warning: failed to upload autograder results file:", e)
+            results_file_id = None
 
-    # Upload student code
-    file_ids = UploadFiles(assignment_path, "*.py")
-    print("Uploaded student files:", file_ids)
-
-    if args.skip_upload_tests:
-        test_file_ids: list[str] = []
-    else:
-        print("Uploading autograder tests for reference...")
-        test_file_ids = UploadAutograderTests(autograder_zip)
-        print("Uploaded autograder test files:", test_file_ids)
-
-    # Upload full autograder results as a document so Claude can access 100% of details
-    try:
-        results_file_id = UploadAutograderResults(raw_results)
-        print("Uploaded autograder results file:", results_file_id)
-    except Exception as e:
-        print("Warning: failed to upload autograder results file:", e)
-        results_file_id = None
-
-    all_file_ids = file_ids + test_file_ids + ([results_file_id] if results_file_id else [])
+    student_file_ids = file_ids + ([results_file_id] if results_file_id else [])
 
     print(autograder_results_text)
 
-    # Build Prompt
-    prompt = build_codeassist_prompt(
+    # Build Prompt: the static part is shared (and cached) across an assignment's students
+    static_prompt = build_codeassist_static_prompt(
         assignment_description="",
         language="Python 3.11",
+    )
+    past_insights = PastInsights(insights, student, autograder_zip.stem, raw_results, args.insight_tokens)
+    prompt = build_codeassist_student_prompt(
         autograder_results=autograder_results_text,
-        past_coding_insights=[]
+        past_coding_insights=past_insights
     )
 
     # Ask Claude
-    response = ClaudeFeedback( all_file_ids, prompt )
-    print(response)
+    if args.stream:
+        def show(key, item):
+            print(f"[{key}]", item if isinstance(item, str) else json.dumps(item), flush=True)
+        response = ClaudeFeedbackStream( student_file_ids, prompt, static_prompt, test_file_ids, on_item=show )
+    else:
+        response = ClaudeFeedback( student_file_ids, prompt, static_prompt, test_file_ids )
 
-    # Delete Uploaded Files
-    DeleteAllFiles()
+    # Delete this run's uploads in the background while the response is printed
+    cleanup = DeleteRunFiles(background=True)
+    print(response)
+    feedback = _feedback_json(response)
+    if store is not None and feedback is not None:
+        store.set_feedback(run_id, feedback)
+    if insights is not None and feedback is not None:
+        insights.add(student, autograder_zip.stem, feedback.get("insights") or [], run_id)
+    deleted = cleanup.result()
+    print(f"Deleted {sum(deleted.values())}/{len(deleted)} uploaded files")
+    run_metrics["rate_limit"] = rate_limiter.stats()
+    print("Run metrics:", json.dumps(run_metrics))
@@ -0,0 +1,368 @@
+"""
+Local stand-in for the parts of the Anthropic API that claude_test uses, for offline runs and load tests:
+
+    python fake_anthropic.py --port 8765 --latency lognormal:0.2,0.5 --rate-429 0.05
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=test python claude_test.py --bulk DIR
+
+Files (upload, list, retrieve, delete), Messages (plain and streamed as server-sent events) and
+Message Batches. Messages return a canned feedback JSON; batches finish batch_delay seconds after
+creation. Every request waits a sampled latency, may be answered with an injected 429 (with
+retry-after) or 529, and is counted per route and status along with message token totals;
+GET /_fake/stats returns the counters.
+"""
+import argparse, itertools, json, math, random, re, threading, time
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+def _now_iso(offset: float = 0.0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset)).isoformat().replace("+00:00", "Z")
+
+def canned_feedback(params: dict) -> str:
+    """Deterministic reply in the {"insights", "annotations"} shape build_codeassist_prompt asks for."""
+    content = params.get("messages", [{}])[-1].get("content", [])
+    docs = sum(1 for b in content if isinstance(b, dict) and b.get("type") == "document")
+    return json.dumps({
+        "insights": [f"Reviewed {docs} attached documents.", "Check edge cases against the failing tests."],
+        "annotations": [{"scope": "global", "hints": ["Look at the first failing test.",
+                                                      "Compare its expected value with yours.",
+                                                      "Verify the loop bound and the empty-input case."]}],
+    })
+
+def _estimate_tokens(params: dict) -> int:
+    return max(1, len(json.dumps(params.get("messages", []))) // 4)
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    Latency sampler from "fixed:S", "uniform:LO,HI", "exponential:MEAN" or "lognormal:MEDIAN,SIGMA"
+    (seconds; a bare number means fixed).
+    """
+    kind, _, args = (spec or "0").partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    a = [float(x) for x in args.split(",")]
+    if kind == "fixed":
+        return lambda: a[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(a[0], a[1])
+    if kind == "exponential":
+        return lambda: rng.expovariate(1 / a[0]) if a[0] > 0 else 0.0
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(math.log(a[0]), a[1]) if a[0] > 0 else 0.0
+    raise ValueError(f"unknown latency distribution: {spec!r}")
+
+def _route(method: str, path: str) -> str:
+    """Counter key with ids collapsed, e.g. "GET /v1/files/{id}"."""
+    return f"{method} " + re.sub(r"/(file|msgbatch)_[^/]+", lambda m: "/{id}", path)
+
+class FakeAnthropic:
+    """
+    In-memory API state shared by the request handler threads. latency / route_latency take
+    parse_latency specs (route_latency keys are prefixes like "POST /v1/messages"); rate_429 and
+    rate_529 are per-request probabilities of an injected error.
+    """
+    def __init__(self, respond: Callable[[dict], str] = canned_feedback, batch_delay: float = 1.0,
+                 latency: str = "0", route_latency: Optional[dict[str, str]] = None,
+                 rate_429: float = 0.0, rate_529: float = 0.0, retry_after: float = 1.0,
+                 stream_chunk_delay: float = 0.0, seed: Optional[int] = None):
+        self.respond = respond
+        self.batch_delay = batch_delay
+        self.rng = random.Random(seed)
+        self.latency = parse_latency(latency, self.rng)
+        self.route_latency = {k: parse_latency(v, self.rng) for k, v in (route_latency or {}).items()}
+        self.rate_429, self.rate_529, self.retry_after = rate_429, rate_529, retry_after
+        self.stream_chunk_delay = stream_chunk_delay
+        self.files: dict[str, dict] = {}
+        self.batches: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.counters: dict[str, dict] = {}
+        self.in_flight = self.max_in_flight = 0
+        self.usage = {"messages": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def sample_latency(self, route: str) -> float:
+        with self.lock:
+            sampler = next((f for prefix, f in self.route_latency.items() if route.startswith(prefix)), self.latency)
+            return max(0.0, sampler())
+
+    def injected_error(self) -> Optional[int]:
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.rate_429:
+            return 429
+        if roll < self.rate_429 + self.rate_529:
+            return 529
+        return None
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def account(self, route: str, status: int, seconds: float, bytes_in: int):
+        with self.lock:
+            self.in_flight -= 1
+            c = self.counters.setdefault(route, {"requests": 0, "statuses": {}, "seconds": 0.0, "bytes_in": 0})
+            c["requests"] += 1
+            c["statuses"][str(status)] = c["statuses"].get(str(status), 0) + 1
+            c["seconds"] = round(c["seconds"] + seconds, 6)
+            c["bytes_in"] += bytes_in
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"routes": json.loads(json.dumps(self.counters)), "max_in_flight": self.max_in_flight,
+                    "usage": dict(self.usage), "files": len(self.files), "batches": len(self.batches)}
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids):012d}"
+
+    def message(self, params: dict) -> dict:
+        text = self.respond(params)
+        usage = {"input_tokens": _estimate_tokens(params), "output_tokens": max(1, len(text) // 4),
+                 "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        with self.lock:
+            self.usage["messages"] += 1
+            self.usage["input_tokens"] += usage["input_tokens"]
+            self.usage["output_tokens"] += usage["output_tokens"]
+        return {
+            "id": self.new_id("msg"), "type": "message", "role": "assistant",
+            "model": params.get("model", "fake"), "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": usage,
+        }
+
+    def batch_view(self, batch: dict, base_url: str) -> dict:
+        ended = time.time() - batch["created"] >= self.batch_delay
+        n = len(batch["requests"])
+        return {
+            "id": batch["id"], "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else n, "succeeded": n if ended else 0,
+                               "errored": 0, "canceled": 0, "expired": 0},
+            "created_at": batch["created_at"], "expires_at": batch["expires_at"],
+            "ended_at": _now_iso() if ended else None, "archived_at": None, "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+_ERRORS = {429: "rate_limit_error", 529: "overloaded_error", 404: "not_found_error", 400: "invalid_request_error"}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api: FakeAnthropic
+
+    def log_message(self, format, *args):
+        pass
+
+    def _base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send(self, status: int, payload=None, content_type: str = "application/json", raw: Optional[bytes] = None,
+              headers: Optional[dict] = None):
+        data = raw if raw is not None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("request-id", self.api.new_id("req"))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        return status
+
+    def _error(self, status: int, message: str, headers: Optional[dict] = None):
+        return self._send(status, {"type": "error", "error": {"type": _ERRORS.get(status, "api_error"), "message": message}},
+                          headers=headers)
+
+    def _handle(self, method: str):
+        split = urlsplit(self.path)
+        route = _route(method, split.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        api = self.api
+        api.begin()
+        started = time.perf_counter()
+        status = 500
+        try:
+            if split.path == "/_fake/stats":
+                status = self._send(200, api.stats())
+                return
+            time.sleep(api.sample_latency(route))
+            injected = api.injected_error()
+            if injected == 429:
+                status = self._error(429, "Injected rate limit", {"retry-after": f"{api.retry_after:g}"})
+            elif injected == 529:
+                status = self._error(529, "Injected overload")
+            else:
+                status = getattr(self, f"_{method.lower()}")(split, body)
+        finally:
+            api.account(route, status, time.perf_counter() - started, len(body))
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _post(self, split, body: bytes) -> int:
+        path, api = split.path, self.api
+        if path == "/v1/messages":
+            params = json.loads(body)
+            if params.get("stream"):
+                return self._stream(params)
+            return self._send(200, api.message(params))
+        if path == "/v1/messages/batches":
+            requests = json.loads(body)["requests"]
+            with api.lock:
+                batch = {"id": api.new_id("msgbatch"), "requests": requests, "created": time.time(),
+                         "created_at": _now_iso(), "expires_at": _now_iso(24 * 3600)}
+                api.batches[batch["id"]] = batch
+            return self._send(200, api.batch_view(batch, self._base_url()))
+        if path == "/v1/files":
+            form = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+            part = next((p for p in form.iter_parts() if p.get_param("name", header="content-disposition") == "file"), None)
+            if part is None:
+                return self._error(400, "Missing file field")
+            data = part.get_payload(decode=True) or b""
+            with api.lock:
+                meta = {"id": api.new_id("file"), "type": "file", "filename": part.get_filename() or "upload",
+                        "mime_type": part.get_content_type(), "size_bytes": len(data),
+                        "created_at": _now_iso(), "downloadable": False}
+                api.files[meta["id"]] = meta
+            return self._send(200, meta)
+        return self._error(404, "Not found")
+
+    def _stream(self, params: dict) -> int:
+        """Server-sent events in the Messages streaming shape, a few characters per text delta."""
+        msg = self.api.message(params)
+        text = msg["content"][0]["text"]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(name: str, data: dict):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+
+        start = {**msg, "content": [], "stop_reason": None, "usage": {**msg["usage"], "output_tokens": 1}}
+        event("message_start", {"type": "message_start", "message": start})
+        event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i in range(0, len(text), 16):
+            if self.api.stream_chunk_delay:
+                time.sleep(self.api.stream_chunk_delay)
+            event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": text[i:i + 16]}})
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": msg["usage"]["output_tokens"]}})
+        event("message_stop", {"type": "message_stop"})
+        return 200
+
+    def _get(self, split, body: bytes) -> int:
+        path, api = split.path, self.api
+        if path == "/v1/files":
+            query = dict(p.split("=", 1) for p in split.query.split("&") if "=" in p)
+            limit = int(query.get("limit", 20))
+            with api.lock:
+                ids = list(api.files)
+            if "after_id" in query and query["after_id"] in ids:
+                ids = ids[ids.index(query["after_id"]) + 1:]
+            page = [api.files[i] for i in ids[:limit] if i in api.files]
+            return self._send(200, {"data": page, "has_more": len(ids) > limit,
+                                    "first_id": page[0]["id"] if page else None,
+                                    "last_id": page[-1]["id"] if page else None})
+        m = re.fullmatch(r"/v1/files/([^/]+)", path)
+        if m:
+            meta = api.files.get(m.group(1))
+            return self._send(200, meta) if meta else self._error(404, "File not found")
+        m = re.fullmatch(r"/v1/messages/batches/([^/]+)(/results)?", path)
+        batch = api.batches.get(m.group(1)) if m else None
+        if batch is None:
+            return self._error(404, "Not found")
+        view = api.batch_view(batch, self._base_url())
+        if not m.group(2):
+            return self._send(200, view)
+        if view["processing_status"] != "ended":
+            return self._error(400, "Batch is still processing")
+        lines = [json.dumps({"custom_id": r["custom_id"], "result": {"type": "succeeded", "message": api.message(r["params"])}})
+                 for r in batch["requests"]]
+        return self._send(200, raw=("\n".join(lines) + "\n").encode(), content_type="application/binary")
+
+    def _delete(self, split, body: bytes) -> int:
+        m = re.fullmatch(r"/v1/files/([^/]+)", split.path)
+        with self.api.lock:
+            meta = self.api.files.pop(m.group(1), None) if m else None
+        if meta is None:
+            return self._error(404, "File not found")
+        return self._send(200, {"id": meta["id"], "type": "file_deleted"})
+
+class FakeAnthropicServer:
+    """Threaded HTTP server around a FakeAnthropic; port 0 picks a free port. Usable as a context manager."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, api: Optional[FakeAnthropic] = None):
+        self.api = api or FakeAnthropic()
+        handler = type("Handler", (_Handler,), {"api": self.api})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeAnthropicServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve a local fake of the Anthropic Files/Messages/Batches API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds before a batch reports ended.")
+    parser.add_argument("--latency", default="0", help="Latency distribution, e.g. fixed:0.05, uniform:0.01,0.2, "
+                                                       "exponential:0.1, lognormal:0.2,0.5.")
+    parser.add_argument("--route-latency", action="append", default=[],
+                        help="Per-route override 'METHOD /path=SPEC', e.g. 'POST /v1/messages=lognormal:2,0.4'.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of an injected 429.")
+    parser.add_argument("--rate-529", type=float, default=0.0, help="Probability of an injected 529.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after seconds sent with 429s.")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="Seconds between streamed text deltas.")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+#--------- Main ---------#
+if __name__ == "__main__":
+    args = parse_args()
+    api = FakeAnthropic(batch_delay=args.batch_delay, latency=args.latency,
+                        route_latency=dict(r.rsplit("=", 1) for r in args.route_latency),
+                        rate_429=args.rate_429, rate_529=args.rate_529, retry_after=args.retry_after,
+                        stream_chunk_delay=args.stream_chunk_delay, seed=args.seed)
+    server = FakeAnthropicServer(args.host, args.port, api)
+    print(f"Fake Anthropic API on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(api.stats(), indent=2))
@@ -0,0 +1,79 @@
+import json
+from typing import Iterator, Optional
+
+class FeedbackStreamParser:
+    """
+    Incremental parser for the strict {"insights": [...], "annotations": [...]} reply.
+    feed() takes text deltas as they stream in and yields (key, item) for every array element of a
+    top-level key as soon as that element is complete. Text before the opening brace (a stray
+    sentence or a ``` fence) is skipped.
+    """
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.stack: list[str] = []
+        self.in_string = self.escape = False
+        self.str_start = self.elem_start = self.root_start = self.root_end = None
+        self.key: Optional[str] = None
+
+    def feed(self, text: str) -> Iterator[tuple[str, object]]:
+        self.buf += text
+        buf, stack = self.buf, self.stack
+        for i in range(self.pos, len(buf)):
+            c = buf[i]
+            if self.root_end is not None:
+                break
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if stack == ["{"]:
+                        self.key = json.loads(buf[self.str_start:i + 1])  # a key (or a stray string value)
+                    elif stack == ["{", "["] and self.elem_start == self.str_start:
+                        yield from self._element(i)
+                continue
+            if not stack and c != "{":
+                continue
+            if c == '"':
+                self.in_string = True
+                self.str_start = i
+                if stack == ["{", "["] and self.elem_start is None:
+                    self.elem_start = i
+            elif c in "{[":
+                if not stack:
+                    self.root_start = i
+                elif stack == ["{", "["] and self.elem_start is None:
+                    self.elem_start = i
+                stack.append(c)
+            elif c in "}]":
+                if c == "]" and stack == ["{", "["] and self.elem_start is not None:
+                    yield from self._element(i - 1)  # bare last element
+                stack.pop()
+                if stack == ["{", "["] and self.elem_start is not None:
+                    yield from self._element(i)
+                elif not stack:
+                    self.root_end = i + 1
+            elif stack == ["{", "["] and self.elem_start is None and c not in " \t\r\n,":
+                self.elem_start = i  # bare number / true / false / null element; ends at the next , or ]
+            elif stack == ["{", "["] and self.elem_start is not None and c == ",":
+                yield from self._element(i - 1)
+        self.pos = len(buf)
+
+    def _element(self, end: int) -> Iterator[tuple[str, object]]:
+        raw, self.elem_start = self.buf[self.elem_start:end + 1].strip(), None
+        try:
+            yield self.key, json.loads(raw)
+        except ValueError:
+            pass
+
+    def result(self) -> Optional[dict]:
+        """The whole reply, once the closing brace has arrived."""
+        if self.root_end is None:
+            return None
+        try:
+            return json.loads(self.buf[self.root_start:self.root_end])
+        except ValueError:
+            return None
@@ -0,0 +1,118 @@
+import fcntl, hashlib, json, os, tempfile, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from grader_cache import default_cache_dir
+
+class FileIdCache:
+    """
+    Persistent map from (filename, content sha256) to a Files API file_id, so identical files
+    (an assignment's tests, unchanged student files) are uploaded once and reused across runs.
+    Entries expire after ttl seconds without use, and the least recently used are evicted past
+    max_entries; either way their file_ids move to an orphan list that cleanup deletes. A reused
+    id is checked against the API once per process, in case the file was deleted elsewhere.
+    """
+    def __init__(self, root: Optional[Path] = None, ttl: float = 7 * 24 * 3600, max_entries: int = 5000):
+        self.root = Path(root or default_cache_dir("file_ids"))
+        self.index = self.root / "index.json"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._validated: set[str] = set()
+
+    @staticmethod
+    def key(filename: str, data: bytes) -> str:
+        # The filename is part of what the model sees (document title), so it's part of the key.
+        return hashlib.sha256(filename.encode() + b"\0" + data).hexdigest()
+
+    def _read(self) -> dict:
+        try:
+            state = json.loads(self.index.read_text())
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("entries", {})
+        state.setdefault("orphans", [])
+        return state
+
+    @contextmanager
+    def _state(self, write: bool = True) -> Iterator[dict]:
+        """The index under this process's lock and an flock shared with other grading processes."""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)  # on first use, so constructing one has no side effects
+            fd = os.open(self.root / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+                state = self._read()
+                yield state
+                if write:
+                    tmp_fd, tmp = tempfile.mkstemp(prefix=".index-", dir=self.root)
+                    with os.fdopen(tmp_fd, "w") as f:
+                        json.dump(state, f)
+                    os.replace(tmp, self.index)
+            finally:
+                os.close(fd)
+
+    def _expire(self, state: dict, now: float):
+        entries = state["entries"]
+        for key, entry in list(entries.items()):
+            if now - entry["last_used"] > self.ttl:
+                state["orphans"].append(entries.pop(key)["file_id"])
+        excess = len(entries) - self.max_entries
+        if excess > 0:
+            for key, _ in sorted(entries.items(), key=lambda kv: kv[1]["last_used"])[:excess]:
+                state["orphans"].append(entries.pop(key)["file_id"])
+
+    def get_or_upload(self, filename: str, data: bytes, upload: Callable[[], str],
+                      exists: Callable[[str], bool]) -> str:
+        """Return the cached file_id for this content, calling upload() only on a miss (or a stale hit)."""
+        key = self.key(filename, data)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:  # threads uploading the same content wait for the first one
+            with self._state(write=False) as state:
+                entry = state["entries"].get(key)
+            now = time.time()
+            if entry and now - entry["last_used"] <= self.ttl:
+                file_id = entry["file_id"]
+                if file_id in self._validated or exists(file_id):
+                    self._validated.add(file_id)
+                    with self._state() as state:
+                        if key in state["entries"]:
+                            state["entries"][key]["last_used"] = now
+                    return file_id
+            file_id = upload()
+            self._validated.add(file_id)
+            with self._state() as state:
+                old = state["entries"].get(key)
+                if old and old["file_id"] != file_id:
+                    if entry is None or old["file_id"] != entry["file_id"]:
+                        # Another process uploaded the same content meanwhile; keep theirs, retire ours.
+                        state["orphans"].append(file_id)
+                        old["last_used"] = now
+                        return old["file_id"]
+                    state["orphans"].append(old["file_id"])  # expired or deleted remotely; replaced below
+                state["entries"][key] = {"file_id": file_id, "filename": filename, "uploaded": now, "last_used": now}
+                self._expire(state, now)
+            return file_id
+
+    def live_ids(self) -> set[str]:
+        """file_ids still in use by the cache (after moving expired/evicted entries to the orphan list)."""
+        with self._state() as state:
+            self._expire(state, time.time())
+            return {e["file_id"] for e in state["entries"].values()}
+
+    def drain_orphans(self) -> list[str]:
+        """Expired, evicted and duplicate file_ids; the caller is now responsible for deleting them."""
+        with self._state() as state:
+            self._expire(state, time.time())
+            orphans, state["orphans"] = state["orphans"], []
+        self._validated.difference_update(orphans)
+        return orphans
+
+    def add_orphans(self, file_ids: list[str]):
+        """Hand back drained file_ids whose delete failed, so a later cleanup retries them."""
+        if file_ids:
+            with self._state() as state:
+                state["orphans"].extend(i for i in file_ids if i not in state["orphans"])
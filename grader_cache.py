@@ -0,0 +1,285 @@
+import fcntl, hashlib, json, os, shutil, subprocess, tempfile, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+def default_cache_dir(kind: str) -> Path:
+    base = os.environ.get("CODEASSIST_CACHE_DIR") or str(Path.home() / ".cache" / "codeassist")
+    return Path(base) / kind
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+_bundle_hashes: dict[tuple, str] = {}
+
+def bundle_sha256(zip_path: str) -> str:
+    """sha256 of a bundle, memoized per (path, size, mtime) so repeated runs don't rehash it."""
+    st = os.stat(zip_path)
+    memo = (str(zip_path), st.st_size, st.st_mtime_ns)
+    if memo not in _bundle_hashes:
+        _bundle_hashes[memo] = file_sha256(Path(zip_path))
+    return _bundle_hashes[memo]
+
+def relative_files(root: Path) -> list[str]:
+    out = []
+    for dirpath, _, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        out.extend(os.path.normpath(os.path.join(rel, name)) for name in filenames)
+    return out
+
+def _tree_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try: total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError: pass
+    return total
+
+@contextmanager
+def _flock(path: Path, mode: int) -> Iterator[bool]:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, mode)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+FICLONE = 0x40049409  # linux/fs.h: share the source's extents copy-on-write (btrfs, xfs, ...)
+
+def _copy_file(s: Path, d: Path):
+    """Private, writable copy of s: a reflink clone where the filesystem supports it, else a plain copy."""
+    try:
+        with open(s, "rb") as fs, open(d, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        shutil.copystat(s, d)
+    except OSError:
+        shutil.copy2(s, d)
+    os.chmod(d, os.stat(d).st_mode | 0o200)
+
+def _place(s: Path, d: Path, link_mode: str):
+    if s.is_symlink():
+        os.symlink(os.readlink(s), d)
+        return
+    if link_mode == "hardlink":
+        try:
+            os.link(s, d)
+            return
+        except OSError:
+            pass
+    _copy_file(s, d)
+
+def unshare(path: Path):
+    """Replace a hardlinked file with a private copy, so changing it leaves the other links alone."""
+    tmp = path.with_name(f".{path.name}.unshare-{os.getpid()}")
+    shutil.copy2(path, tmp)
+    os.replace(tmp, path)
+
+def clone_tree(src: Path, dst: Path, link_mode: str = "copy"):
+    """
+    Recreate src under dst.
+    - "copy" (default): cp --reflink=auto, i.e. copy-on-write where the filesystem supports it.
+    - "hardlink": directories are real, files are hardlinks (falls back to copies across devices).
+      Faster, but a process that can write through the read-only bits (root) changes src too.
+    """
+    dst.mkdir(parents=True, exist_ok=True)
+    if link_mode == "copy":
+        proc = subprocess.run(["cp", "-a", "--reflink=auto", f"{src}/.", str(dst)], capture_output=True, text=True)
+        if proc.returncode != 0:
+            shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+        _make_writable(dst)  # private copies, so the template's read-only bits are not needed
+        return
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = Path(dirpath).relative_to(src)
+        for d in dirnames:
+            (dst / rel / d).mkdir(exist_ok=True)
+        for name in filenames:
+            _place(Path(dirpath) / name, dst / rel / name, "hardlink")
+
+def _same_file(s: Path, d: Path, link_mode: str) -> bool:
+    if link_mode == "hardlink":
+        return os.path.samefile(s, d)
+    # Copies keep size and mtime, so a file setup didn't touch matches the bundle copy already there.
+    a, b = os.lstat(s), os.lstat(d)
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+def overlay_tree(src: Path, dst: Path, skip: set[Path], link_mode: str = "copy"):
+    """Copy (or hardlink) src's files over dst, replacing what is there except paths in skip."""
+    for rel in relative_files(src):
+        s, d = src / rel, dst / rel
+        if d in skip:
+            continue
+        if d.exists() or d.is_symlink():
+            if not d.is_symlink() and not s.is_symlink() and _same_file(s, d, link_mode):
+                continue
+            d.unlink()
+        d.parent.mkdir(parents=True, exist_ok=True)
+        _place(s, d, link_mode)
+
+class DirCache:
+    """
+    Content-keyed directory entries shared between grading processes.
+    Entries are built once under an exclusive per-key lock, published with an atomic rename,
+    and evicted least-recently-used once the cache grows past max_bytes. Readers hold a shared
+    lock while using an entry, so eviction never removes a directory that is being read.
+    """
+    def __init__(self, root: Path, max_bytes: int = 2 << 30):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _lock(self, key: str) -> Path:
+        return self.root / f"{key}.lock"
+
+    def _meta(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def _build(self, key: str, build: Callable[[Path], None]):
+        with _flock(self._lock(key), fcntl.LOCK_EX):
+            if self.path(key).is_dir():
+                return
+            staging = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=self.root))
+            try:
+                staging.chmod(0o755)
+                build(staging)
+                size = _tree_size(staging)
+                os.rename(staging, self.path(key))
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            self._meta(key).write_text(json.dumps({"size": size, "created": time.time()}))
+        self.evict(keep=key)
+
+    @contextmanager
+    def use(self, key: str, build: Callable[[Path], None]) -> Iterator[Path]:
+        """Yield the entry for key, building it first if needed."""
+        while True:
+            if not self.path(key).is_dir():
+                self._build(key, build)
+            with _flock(self._lock(key), fcntl.LOCK_SH):
+                entry = self.path(key)
+                if not entry.is_dir():
+                    continue  # evicted between build and lock; rebuild
+                try: os.utime(self._meta(key))
+                except OSError: pass
+                yield entry
+                return
+
+    def invalidate(self, key: str):
+        with _flock(self._lock(key), fcntl.LOCK_EX):
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self.path(key)
+        if entry.is_dir():
+            trash = self.root / f".trash-{key}-{os.getpid()}"
+            os.rename(entry, trash)
+            _make_writable(trash)
+            shutil.rmtree(trash, ignore_errors=True)
+        self._meta(key).unlink(missing_ok=True)
+
+    def evict(self, keep: Optional[str] = None):
+        with _flock(self.root / ".evict.lock", fcntl.LOCK_EX | fcntl.LOCK_NB) as acquired:
+            if not acquired:
+                return  # another process is already evicting
+            entries = []
+            for meta in self.root.glob("*.json"):
+                try:
+                    entries.append((meta.stat().st_mtime, meta.stem, json.loads(meta.read_text()).get("size", 0)))
+                except (OSError, ValueError):
+                    continue
+            total = sum(size for _, _, size in entries)
+            for _, key, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                with _flock(self._lock(key), fcntl.LOCK_EX | fcntl.LOCK_NB) as free:
+                    if not free:
+                        continue  # in use by another grader
+                    self._remove(key)
+                    total -= size
+
+def _make_writable(path: Path):
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            p = os.path.join(dirpath, name)
+            if not os.path.islink(p):
+                try: os.chmod(p, os.lstat(p).st_mode | 0o200)
+                except OSError: pass
+
+def _make_readonly(path: Path):
+    # Guards cache templates against stray writes; only hardlinked workspaces share their inodes.
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            p = os.path.join(dirpath, name)
+            if not os.path.islink(p):
+                try: os.chmod(p, os.lstat(p).st_mode & ~0o222)
+                except OSError: pass
+
+class BundleCache:
+    """
+    Pristine extracted autograder bundles keyed by the zip's sha256. Workspaces get private copies
+    (reflinks where possible); link_mode="hardlink" shares inodes instead, for graders that never
+    run as root.
+    """
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = 2 << 30, link_mode: str = "copy"):
+        self.cache = DirCache(root or default_cache_dir("bundles"), max_bytes)
+        self.link_mode = link_mode
+
+    def _extract(self, zip_path: str, timeout: int) -> Callable[[Path], None]:
+        zip_path = str(Path(zip_path).resolve())
+        def build(dest: Path):
+            subprocess.run(["unzip", "-q", zip_path, "-d", str(dest)],
+                           cwd=str(dest), capture_output=True, text=True, timeout=timeout, check=True)
+            for name in ("run_autograder", "setup.sh"):
+                for p in dest.rglob(name):
+                    p.chmod(p.stat().st_mode | 0o111)
+            _make_readonly(dest)
+        return build
+
+    def populate(self, zip_path: str, work: Path, timeout: int = 180):
+        """Fill work with the bundle's files. Raises CalledProcessError if unzip fails."""
+        with self.cache.use(bundle_sha256(zip_path), self._extract(zip_path, timeout)) as template:
+            clone_tree(template, work, self.link_mode)
+
+class SetupCache:
+    """
+    Bundle workspaces as they look after setup.sh ran, keyed by bundle content and the interpreter
+    setup ran under (setup usually pip-installs into it). A changed bundle hashes to a new key.
+    Each entry holds tree/ (the post-setup files) and setup.json (setup output, files it removed).
+    Restores copy like BundleCache, with the same opt-in link_mode="hardlink".
+    """
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = 2 << 30, link_mode: str = "copy"):
+        self.cache = DirCache(root or default_cache_dir("setup"), max_bytes)
+        self.link_mode = link_mode
+
+    def key(self, zip_path: str, python: str) -> str:
+        return hashlib.sha256(f"{bundle_sha256(zip_path)}\n{python}".encode()).hexdigest()
+
+    def restore(self, key: str, build: Callable[[Path], None], work: Path, skip: set[Path]) -> dict:
+        """Overlay the snapshot onto work (leaving skip alone), building it first if needed."""
+        built = []
+        def build_readonly(staging: Path):
+            build(staging)
+            _make_readonly(staging / "tree")
+            built.append(key)
+        with self.cache.use(key, build_readonly) as entry:
+            meta = json.loads((entry / "setup.json").read_text())
+            overlay_tree(entry / "tree", work, skip, self.link_mode)
+        for rel in meta.get("removed", []):
+            p = work / rel
+            if p not in skip:
+                p.unlink(missing_ok=True)
+        meta["setup_cache_hit"] = not built
+        return meta
@@ -0,0 +1,67 @@
+import json, os, resource, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+# Usage dicts (capture.rusage_dict) of processes finished during the current phase.
+_phase_usage: ContextVar[Optional[list]] = ContextVar("_phase_usage", default=None)
+
+def record_usage(proc):
+    """Attach a finished process's own rusage to the phase it ran in (no-op outside a phase)."""
+    usage, procs = getattr(proc, "usage", None), _phase_usage.get()
+    if usage and procs is not None:
+        procs.append(usage)
+
+class PhaseTimer:
+    """
+    Per-phase wall time, child CPU seconds and peak child RSS, written into result["timings"] and
+    result["resources"]. CPU comes from RUSAGE_CHILDREN deltas plus processes reaped elsewhere
+    (the warm pytest server's forks); peak RSS is the largest process that finished in the phase.
+    """
+    def __init__(self, result: dict):
+        self.timings = result.setdefault("timings", {})
+        self.resources = result.setdefault("resources", {})
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        token = _phase_usage.set([])
+        try:
+            yield
+        finally:
+            procs = _phase_usage.get()
+            _phase_usage.reset(token)
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+            cpu += sum(u["user_s"] + u["sys_s"] for u in procs if not u.get("child", True))
+            peak = max((u["maxrss_kb"] for u in procs), default=0)
+            if after.ru_maxrss > before.ru_maxrss:
+                peak = max(peak, after.ru_maxrss)
+            self.timings[name] = round(time.perf_counter() - start, 4)
+            self.resources[name] = {"cpu_s": round(cpu, 4), "peak_rss_kb": peak, "processes": len(procs)}
+
+    def finish(self):
+        self.timings["total"] = round(time.perf_counter() - self._start, 4)
+
+def emit_metrics(log_path: Optional[str], zip_path: str, student_dir: Optional[str], result: dict):
+    """Append one JSON line describing a grading run to log_path (nothing if unset)."""
+    if not log_path:
+        return
+    record = {
+        "ts": time.time(),
+        "bundle": Path(zip_path).name,
+        "submission": Path(student_dir).name if student_dir else None,
+        "returncode": result.get("returncode"),
+        "timings": result.get("timings", {}),
+        "resources": result.get("resources", {}),
+        **{k: result[k] for k in ("venv_cache_hit", "setup_cache_hit", "result_cache_hit") if k in result},
+    }
+    # One write on an O_APPEND fd, so lines from parallel batch workers don't interleave.
+    fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, (json.dumps(record) + "\n").encode())
+    finally:
+        os.close(fd)
@@ -0,0 +1,19 @@
+# On PYTHONPATH for graded runs. When the grader asks for per-test budgets (GRADER_TEST_TIMEOUT),
+# the first interpreter to start -- the unittest runner -- installs them; the variable is consumed
+# so interpreters the tests spawn don't pay for it. Any other sitecustomize is still loaded.
+import importlib.machinery, importlib.util, os, sys
+
+_budget = os.environ.pop("GRADER_TEST_TIMEOUT", None)
+if _budget:
+    import grader_timeouts
+    grader_timeouts.install_unittest_timeouts(float(_budget))
+
+def _chain():
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = [p for p in sys.path if os.path.abspath(p or ".") != here]
+    spec = importlib.machinery.PathFinder.find_spec("sitecustomize", path)
+    if spec and spec.loader:
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+_chain()
@@ -0,0 +1,96 @@
+import os, re, sqlite3, threading, time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from grader_cache import default_cache_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS insights (
+    id INTEGER PRIMARY KEY,
+    student TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    run_id INTEGER,
+    created REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS insights_student ON insights(student, created);
+CREATE VIRTUAL TABLE IF NOT EXISTS insights_fts USING fts5(
+    text, assignment, content='insights', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS insights_ai AFTER INSERT ON insights BEGIN
+    INSERT INTO insights_fts(rowid, text, assignment) VALUES (new.id, new.text, new.assignment);
+END;
+CREATE TRIGGER IF NOT EXISTS insights_ad AFTER DELETE ON insights BEGIN
+    INSERT INTO insights_fts(insights_fts, rowid, text, assignment) VALUES ('delete', old.id, old.text, old.assignment);
+END;
+"""
+
+# Words in test names that say nothing about the mistake.
+_STOP = {"test", "tests", "testcase", "case", "self", "the", "and", "for", "with", "check", "py"}
+
+def _terms(texts: Iterable[str]) -> list[str]:
+    """Lowercase search terms from assignment/test names: split on punctuation, underscores and camelCase."""
+    terms: dict[str, None] = {}
+    for text in texts:
+        for word in re.findall(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+", text or ""):
+            word = word.lower()
+            if len(word) >= 3 and word not in _STOP:
+                terms[word] = None
+    return list(terms)
+
+class InsightIndex:
+    """
+    Per-student store of the "insights" bullets from past feedback, with BM25 (SQLite FTS5) retrieval
+    of the ones relevant to the current assignment and failing tests. Lives in the result store's
+    database by default.
+    """
+    def __init__(self, path: Optional[Path] = None):
+        path = path or os.environ.get("CODEASSIST_RESULT_DB") or default_cache_dir("store") / "results.sqlite"
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def add(self, student: str, assignment: str, insights: Iterable[str], run_id: Optional[int] = None):
+        now = time.time()
+        rows = [(student, assignment, run_id, now, i.strip()) for i in insights if isinstance(i, str) and i.strip()]
+        with self._lock, self.db:
+            self.db.executemany("INSERT INTO insights (student, assignment, run_id, created, text) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def retrieve(self, student: str, assignment: str, failing_tests: Iterable[str] = (), k: int = 5,
+                 token_budget: int = 300) -> list[str]:
+        """
+        Up to k of the student's past insights, best BM25 match against the assignment and failing
+        test names first, topped up with the most recent ones; capped at ~token_budget tokens.
+        """
+        terms = _terms([assignment, *failing_tests])
+        picked: dict[str, None] = {}
+        with self._lock:
+            if terms:
+                query = " OR ".join(f'"{t}"' for t in terms)
+                rows = self.db.execute(
+                    "SELECT i.text FROM insights_fts f JOIN insights i ON i.id = f.rowid"
+                    " WHERE insights_fts MATCH ? AND i.student = ?"
+                    " ORDER BY bm25(insights_fts), i.assignment = ? DESC, i.created DESC LIMIT ?",
+                    (query, student, assignment, k * 4)).fetchall()
+                picked.update((r[0], None) for r in rows)
+            if len(picked) < k:
+                rows = self.db.execute("SELECT text FROM insights WHERE student = ? ORDER BY created DESC LIMIT ?",
+                                       (student, k * 4)).fetchall()
+                picked.update((r[0], None) for r in rows)
+        out, used = [], 0
+        for text in picked:
+            cost = len(text) // 4 + 1
+            if len(out) >= k:
+                break
+            if used + cost > token_budget:
+                continue
+            out.append(text)
+            used += cost
+        return out
@@ -0,0 +1,228 @@
+import json, os, signal, subprocess, sys, tempfile, threading, time, zipfile
+from pathlib import Path
+from typing import Optional
+
+from capture import CapturedProcess, limit_file_size, read_bounded, rusage_dict
+
+# Server side runs inside the bundle's interpreter (possibly a venv), so it only uses the stdlib and pytest.
+
+def _drop_modules_under(root: str):
+    root = os.path.realpath(root)
+    for name, mod in list(sys.modules.items()):
+        f = getattr(mod, "__file__", None)
+        if f and os.path.realpath(f).startswith(root + os.sep):
+            del sys.modules[name]
+
+def _preload_timeout(signum, frame):
+    raise TimeoutError("preload took too long")
+
+def _preload(root: str, budget: int = 30):
+    """
+    Import pytest, its plugins and everything the bundle's tests import, then forget the bundle's own modules.
+    root is a pristine copy of the bundle (no student code), and the whole pass is capped at budget seconds.
+    """
+    import pytest
+    saved_path, saved_cwd = list(sys.path), os.getcwd()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    saved_out, saved_err = os.dup(1), os.dup(2)
+    signal.signal(signal.SIGALRM, _preload_timeout)
+    signal.alarm(budget)
+    try:
+        os.dup2(devnull, 1); os.dup2(devnull, 2)
+        os.chdir(root)
+        sys.path.insert(0, root)
+        # Collection imports conftest and test modules; failures (e.g. missing student module) are fine here.
+        pytest.main(["--collect-only", "-q", "-p", "no:cacheprovider", root])
+    except BaseException:
+        pass
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        sys.stdout.flush(); sys.stderr.flush()
+        os.dup2(saved_out, 1); os.dup2(saved_err, 2)
+        os.close(devnull); os.close(saved_out); os.close(saved_err)
+        os.chdir(saved_cwd)
+        sys.path[:] = saved_path
+    # Test and student modules must be imported fresh per submission; their dependencies stay warm.
+    _drop_modules_under(root)
+
+def _child(job: dict):
+    import pytest, tempfile
+    out = os.open(job["stdout_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    err = os.open(job["stderr_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(out, 1); os.dup2(err, 2)
+    if job.get("max_output") is not None:
+        limit_file_size(job["max_output"])
+        signal.signal(signal.SIGXFSZ, signal.SIG_DFL)  # Python ignores it; die like a subprocess would
+    os.environ.clear()
+    os.environ.update(job["env"])
+    os.chdir(job["cwd"])
+    # Mirror `python -m pytest` under this env: cwd first, then PYTHONPATH.
+    extra = [p for p in job["env"].get("PYTHONPATH", "").split(os.pathsep) if p]
+    sys.path[:0] = [job["cwd"]] + extra
+    tempfile.tempdir = None
+    sys.argv = ["pytest"] + job["args"]
+    rc = pytest.main(job["args"])
+    sys.stdout.flush(); sys.stderr.flush()
+    os._exit(int(rc))
+
+def _output_size(paths: list[str]) -> int:
+    total = 0
+    for p in paths:
+        try: total += os.stat(p).st_size
+        except OSError: pass
+    return total
+
+def _wait(pid: int, timeout: float, outputs: list[str], max_output: Optional[int]) -> tuple[Optional[int], bool, dict]:
+    """Wait for the child; returns (exit code or None on timeout, killed for exceeding max_output, rusage)."""
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        done, status, ru = os.wait4(pid, os.WNOHANG)
+        if done:
+            rc = os.waitstatus_to_exitcode(status)
+            limited = rc == -signal.SIGXFSZ or (max_output is not None and _output_size(outputs) > max_output)
+            return rc, limited, rusage_dict(ru, child=False)
+        timed_out = time.monotonic() >= deadline
+        limited = max_output is not None and _output_size(outputs) > max_output
+        if timed_out or limited:
+            try: os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError: pass
+            _, status, ru = os.wait4(pid, 0)
+            return (None if timed_out else os.waitstatus_to_exitcode(status)), limited, rusage_dict(ru, child=False)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.02)
+
+def _serve(root: str):
+    # Requests arrive on stdin, replies go out on the original stdout; anything else printing goes to stderr.
+    chan = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    _preload(root)
+    chan.write(json.dumps({"ready": True}) + "\n")
+    chan.flush()
+    for line in sys.stdin:
+        job = json.loads(line)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.setpgid(0, 0)  # so a timeout also kills whatever the tests spawned
+                _child(job)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(70)
+        rc, limited, usage = _wait(pid, job["timeout"], [job["stdout_path"], job["stderr_path"]], job.get("max_output"))
+        chan.write(json.dumps({"returncode": rc, "timeout": rc is None, "output_limited": limited, "usage": usage}) + "\n")
+        chan.flush()
+
+# -------- Client side --------
+class _Server:
+    def __init__(self, python: str, zip_path: str, env: dict):
+        # Preload from a pristine extraction so no student code runs in the long-lived server.
+        with tempfile.TemporaryDirectory(prefix="pytest_pool_") as root:
+            with zipfile.ZipFile(zip_path) as zf:
+                zf.extractall(root)
+            self.proc = subprocess.Popen([python, str(Path(__file__).resolve()), "--serve", root],
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+            ready = self.proc.stdout.readline()
+        if not json.loads(ready or "{}").get("ready"):
+            self.close()
+            raise RuntimeError("pytest pool server failed to start")
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, job: dict) -> dict:
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+        reply = self.proc.stdout.readline()
+        if not reply:
+            raise RuntimeError("pytest pool server exited")
+        return json.loads(reply)
+
+    def close(self):
+        try: self.proc.stdin.close()
+        except Exception: pass
+        try: self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired: self.proc.kill()
+
+class WarmPytestPool:
+    """
+    Pre-started pytest servers, one set per (interpreter, bundle). Each server has pytest, its plugins
+    and the bundle's test dependencies imported already, and forks a fresh child per submission.
+    """
+    def __init__(self, size: int = 1):
+        self.size = size
+        self._idle: dict[tuple, list[_Server]] = {}
+        self._count: dict[tuple, int] = {}
+        self._lock = threading.Condition()
+
+    def _acquire(self, key: tuple, zip_path: str, env: dict) -> _Server:
+        with self._lock:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                while idle:
+                    server = idle.pop()
+                    if server.alive():
+                        return server
+                    self._count[key] -= 1
+                if self._count.get(key, 0) < self.size:
+                    self._count[key] = self._count.get(key, 0) + 1
+                    break
+                self._lock.wait()
+        # Servers outlive this workspace; each child gets its own PYTHONPATH from the job instead.
+        server_env = {k: v for k, v in env.items() if k != "PYTHONPATH"}
+        try:
+            return _Server(key[0], zip_path, server_env)
+        except Exception:
+            with self._lock:
+                self._count[key] -= 1
+                self._lock.notify()
+            raise
+
+    def _release(self, key: tuple, server: _Server):
+        with self._lock:
+            if server.alive():
+                self._idle.setdefault(key, []).append(server)
+            else:
+                self._count[key] -= 1
+            self._lock.notify()
+
+    def run(self, python: str, zip_path: str, bundle_key: str, args: list[str], cwd: Path, env: dict,
+            timeout: int, max_output: Optional[int] = None) -> CapturedProcess:
+        """Run `pytest args` in cwd like `python -m pytest` would; raises TimeoutExpired like subprocess.run."""
+        key = (python, bundle_key)
+        server = self._acquire(key, zip_path, env)
+        scratch = Path(env.get("TMPDIR") or cwd)
+        out_path, err_path = scratch / "pytest_pool.stdout", scratch / "pytest_pool.stderr"
+        try:
+            reply = server.request({"args": args, "cwd": str(cwd), "env": env, "timeout": timeout,
+                                    "max_output": max_output,
+                                    "stdout_path": str(out_path), "stderr_path": str(err_path)})
+        except Exception:
+            server.close()
+            raise
+        finally:
+            self._release(key, server)
+        try:
+            stdout, stderr = read_bounded(out_path), read_bounded(err_path)
+        finally:
+            out_path.unlink(missing_ok=True)
+            err_path.unlink(missing_ok=True)
+        cmd = [python, "-m", "pytest"] + args
+        if reply.get("timeout"):
+            raise subprocess.TimeoutExpired(cmd, timeout, output=stdout.text(), stderr=stderr.text())
+        return CapturedProcess(cmd, reply["returncode"], stdout, stderr, output_limited=reply.get("output_limited", False),
+                               usage=reply.get("usage"))
+
+    def close(self):
+        with self._lock:
+            for servers in self._idle.values():
+                for s in servers:
+                    s.close()
+            self._idle.clear()
+            self._count.clear()
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--serve"]:
+    _serve(sys.argv[2])
@@ -0,0 +1,174 @@
+import os, random, threading, time
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Statuses worth retrying: rate limited / overloaded shrink concurrency, the rest just back off.
+THROTTLE_STATUSES = {429, 529}
+RETRY_STATUSES = {408, 409, 500, 502, 503, 504} | THROTTLE_STATUSES
+_RETRY_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+def status_of(exc: BaseException) -> Optional[int]:
+    return getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from the retry-after(-ms) header of an SDK error's response, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return max(0.0, float(headers.get(name)) * scale)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def is_retryable(exc: BaseException) -> bool:
+    return status_of(exc) in RETRY_STATUSES or type(exc).__name__ in _RETRY_ERRORS
+
+class TokenBucket:
+    """
+    rate per second, holding at most capacity. take(n) waits until min(n, capacity) is available and
+    then debits all of n, so one request larger than the bucket still goes through and the debt is
+    repaid before the next. A rate of 0 or None means unlimited.
+    """
+    def __init__(self, rate: Optional[float], capacity: float):
+        self.rate = rate or 0.0
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, n: float = 1.0) -> float:
+        """Debit n, sleeping as needed; returns the seconds waited."""
+        if not self.rate or n <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                need = min(n, self.capacity) - self.level
+                if need <= 0:
+                    self.level -= n
+                    return waited
+                wait = need / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def debit(self, n: float):
+        """Charge n more (or refund a negative n) after the fact, e.g. actual vs estimated tokens."""
+        if self.rate:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.level = min(self.capacity, self.level - n)
+
+class RateLimiter:
+    """
+    Shared gate for API calls. Each call takes a request token and its estimated input tokens from
+    per-minute token buckets and one concurrency slot. The concurrency limit follows AIMD:
+    +1/limit per success, halved on a 429/529 (at most once per cool-down), and every caller holds
+    off until a retry-after passes. Retryable failures back off with full jitter. Buckets left at
+    None are unlimited, so only AIMD on the API's own 429s bounds the rate.
+    """
+    def __init__(self, requests_per_minute: Optional[float] = None, input_tokens_per_minute: Optional[float] = None,
+                 initial_concurrency: float = 4, min_concurrency: float = 1, max_concurrency: float = 32,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0, burst_seconds: float = 10.0):
+        rps = (requests_per_minute or 0) / 60
+        tps = (input_tokens_per_minute or 0) / 60
+        self.requests = TokenBucket(rps, max(1.0, rps * burst_seconds))
+        self.tokens = TokenBucket(tps, max(1.0, tps * burst_seconds))
+        self.limit = float(initial_concurrency)
+        self.min_concurrency, self.max_concurrency = min_concurrency, max_concurrency
+        self.max_retries, self.base_delay, self.max_delay = max_retries, base_delay, max_delay
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.counts = {"calls": 0, "retries": 0, "throttled": 0, "waited_s": 0.0}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """
+        Limits from CODEASSIST_RPM / CODEASSIST_ITPM (unset or 0: unlimited; set them to the account
+        tier's limits to stay under them) and CODEASSIST_API_CONCURRENCY.
+        """
+        return cls(requests_per_minute=float(os.environ.get("CODEASSIST_RPM") or 0) or None,
+                   input_tokens_per_minute=float(os.environ.get("CODEASSIST_ITPM") or 0) or None,
+                   max_concurrency=float(os.environ.get("CODEASSIST_API_CONCURRENCY", "32")))
+
+    def _acquire(self) -> float:
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight < max(1, int(self.limit)):
+                    self.in_flight += 1
+                    return time.monotonic() - started
+                else:
+                    self._cond.wait()
+
+    def _release(self, ok: bool):
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _throttled(self, delay: Optional[float]):
+        now = time.monotonic()
+        with self._cond:
+            self.counts["throttled"] += 1
+            # One halving per cool-down: the calls already in flight report the same overload.
+            if now - self._last_decrease > max(1.0, delay or 0.0):
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._last_decrease = now
+            if delay:
+                self._paused_until = max(self._paused_until, now + delay)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, delay: Optional[float]) -> float:
+        if delay is not None:
+            return delay + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn: Callable[[], T], input_tokens: float = 0) -> T:
+        """
+        fn() under the limits, retried on 429/529/5xx/connection errors up to max_retries times.
+        The buckets are charged once per call; retries wait on the backoff and concurrency slot only.
+        """
+        attempt = 0
+        waited = self.requests.take(1) + self.tokens.take(input_tokens)
+        while True:
+            waited += self._acquire()
+            ok = False
+            try:
+                result = fn()
+                ok = True
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = retry_after(e)
+                if status_of(e) in THROTTLE_STATUSES:
+                    self._throttled(delay)
+            finally:
+                self._release(ok)
+                with self._cond:
+                    self.counts["calls"] += 1
+                    self.counts["waited_s"] += waited
+                waited = 0.0
+            sleep = self._backoff(attempt, delay)
+            with self._cond:
+                self.counts["retries"] += 1
+                self.counts["waited_s"] += sleep
+            time.sleep(sleep)
+            attempt += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self.counts, "waited_s": round(self.counts["waited_s"], 3), "concurrency": round(self.limit, 2)}
@@ -0,0 +1,94 @@
+import hashlib, json, os, tempfile, time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from grader_cache import bundle_sha256, default_cache_dir
+
+# Bump when the shape of run_autograder_zip's result changes so stale entries stop matching.
+RESULT_CACHE_VERSION = 2
+
+_IGNORED_NAMES = {"__pycache__", ".DS_Store", ".git", ".pytest_cache"}
+
+def submission_sha256(student_dir: Optional[str]) -> str:
+    """Canonical hash of a submission: relative paths and contents, independent of mtimes and walk order."""
+    h = hashlib.sha256()
+    if not student_dir:
+        return h.hexdigest()
+    root = Path(student_dir)
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in _IGNORED_NAMES]
+        files.extend(Path(dirpath) / f for f in filenames if f not in _IGNORED_NAMES and not f.endswith(".pyc"))
+    for p in sorted(files, key=lambda p: p.relative_to(root).as_posix()):
+        h.update(p.relative_to(root).as_posix().encode() + b"\0")
+        h.update(p.read_bytes())
+        h.update(b"\0")
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    Finished result dicts keyed by (bundle hash, submission hash, grading options), one JSON file each.
+    Entries expire after ttl seconds; the oldest are evicted once the cache exceeds max_bytes.
+    Bundles listed in bypass (zip file names or sha256s, plus CODEASSIST_RESULT_CACHE_BYPASS) are never cached.
+    """
+    def __init__(self, root: Optional[Path] = None, ttl: float = 7 * 24 * 3600, max_bytes: int = 512 << 20,
+                 bypass: Iterable[str] = (), evict_every: int = 100):
+        self.root = Path(root or default_cache_dir("results"))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        env_bypass = [b for b in os.environ.get("CODEASSIST_RESULT_CACHE_BYPASS", "").split(",") if b]
+        self.bypass = set(bypass) | set(env_bypass)
+        self.evict_every = evict_every
+        self._puts = 0
+
+    def bypassed(self, zip_path: str) -> bool:
+        return bool(self.bypass) and (Path(zip_path).name in self.bypass or bundle_sha256(zip_path) in self.bypass)
+
+    def key(self, zip_path: str, student_dir: Optional[str], **options) -> tuple[str, str]:
+        opts = json.dumps({"v": RESULT_CACHE_VERSION, **options}, sort_keys=True)
+        sub = hashlib.sha256(f"{submission_sha256(student_dir)}\n{opts}".encode()).hexdigest()
+        return bundle_sha256(zip_path), sub
+
+    def _path(self, key: tuple[str, str]) -> Path:
+        return self.root / key[0] / f"{key[1]}.json"
+
+    def get(self, key: tuple[str, str]) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            result = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        result["result_cache_hit"] = True
+        return result
+
+    def put(self, key: tuple[str, str], result: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".result-", dir=path.parent)
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)  # readers in other processes see the old file or the new one, never half
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            try: st = path.stat()
+            except OSError: continue
+            if now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
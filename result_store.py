@@ -0,0 +1,140 @@
+import json, os, sqlite3, threading, time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from grader_cache import default_cache_dir
+from junit_report import collect_test_records
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    assignment TEXT NOT NULL,
+    student TEXT NOT NULL,
+    created REAL NOT NULL,
+    bundle_sha256 TEXT,
+    returncode INTEGER,
+    score REAL,
+    max_score REAL,
+    note TEXT,
+    timings TEXT,
+    feedback TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    assignment TEXT NOT NULL,
+    student TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    score REAL,
+    max_score REAL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_assignment_student ON runs(assignment, student, id);
+CREATE INDEX IF NOT EXISTS runs_student ON runs(student, id);
+CREATE INDEX IF NOT EXISTS tests_run ON tests(run_id);
+CREATE INDEX IF NOT EXISTS tests_assignment_name_status ON tests(assignment, name, status);
+CREATE INDEX IF NOT EXISTS tests_student ON tests(student, assignment);
+CREATE INDEX IF NOT EXISTS tests_status ON tests(assignment, status);
+"""
+
+# Latest run per student for an assignment; cohort questions are about current state, not every retry.
+_LATEST = "SELECT max(id) FROM runs WHERE assignment = ? GROUP BY student"
+
+class ResultStore:
+    """
+    SQLite (WAL) store of grading runs: one row per run (return code, score, timings, feedback JSON)
+    and one per test, indexed by assignment, student, test name and status.
+    Safe to share between threads; other processes can read while batch grading writes.
+    """
+    def __init__(self, path: Optional[Path] = None):
+        path = path or os.environ.get("CODEASSIST_RESULT_DB") or default_cache_dir("store") / "results.sqlite"
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def _insert(self, assignment: str, student: str, result: dict, feedback) -> int:
+        gr = result.get("gradescope_results") if isinstance(result.get("gradescope_results"), dict) else {}
+        cur = self.db.execute(
+            "INSERT INTO runs (assignment, student, created, bundle_sha256, returncode, score, max_score, note,"
+            " timings, feedback) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (assignment, student, time.time(), result.get("bundle_sha256"), result.get("returncode"),
+             gr.get("score"), gr.get("max_score"), result.get("note"),
+             json.dumps(result.get("timings")) if result.get("timings") else None,
+             json.dumps(feedback) if feedback is not None else None))
+        run_id = cur.lastrowid
+        self.db.executemany(
+            "INSERT INTO tests (run_id, assignment, student, name, status, score, max_score, message)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, assignment, student, t["name"], t["status"], t["score"], t["max_score"], t["message"])
+             for t in collect_test_records(result)])
+        return run_id
+
+    def add_runs(self, runs: Iterable[tuple]) -> list[int]:
+        """Insert (assignment, student, result[, feedback]) tuples in one transaction; returns run ids."""
+        with self._lock, self.db:
+            return [self._insert(*run) if len(run) == 4 else self._insert(*run, None) for run in runs]
+
+    def add_run(self, assignment: str, student: str, result: dict, feedback=None) -> int:
+        return self.add_runs([(assignment, student, result, feedback)])[0]
+
+    def set_feedback(self, run_id: int, feedback):
+        with self._lock, self.db:
+            self.db.execute("UPDATE runs SET feedback = ? WHERE id = ?", (json.dumps(feedback), run_id))
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict]:
+        with self._lock:
+            return [dict(row) for row in self.db.execute(sql, params)]
+
+    def history(self, student: str, assignment: Optional[str] = None, limit: int = 50) -> list[dict]:
+        """A student's runs, newest first, with feedback and timings decoded."""
+        sql = "SELECT * FROM runs WHERE student = ?" + (" AND assignment = ?" if assignment else "")
+        rows = self._query(sql + " ORDER BY id DESC LIMIT ?",
+                           (student, assignment, limit) if assignment else (student, limit))
+        for row in rows:
+            for key in ("timings", "feedback"):
+                row[key] = json.loads(row[key]) if row[key] else None
+        return rows
+
+    def tests_for_run(self, run_id: int) -> list[dict]:
+        return self._query("SELECT name, status, score, max_score, message FROM tests WHERE run_id = ?", (run_id,))
+
+    def students_with_status(self, assignment: str, test_name: str, statuses: Iterable[str] = ("failed", "error", "timeout")) -> list[str]:
+        """Students whose latest run of assignment has test_name in one of statuses."""
+        statuses = list(statuses)
+        marks = ",".join("?" * len(statuses))
+        return [r["student"] for r in self._query(
+            f"SELECT DISTINCT student FROM tests WHERE assignment = ? AND name = ? AND status IN ({marks})"
+            f" AND run_id IN ({_LATEST}) ORDER BY student", (assignment, test_name, *statuses, assignment))]
+
+    def cohort_stats(self, assignment: str) -> dict:
+        """Latest-run summary for an assignment: score distribution, return codes and per-test pass rates."""
+        runs = self._query(f"SELECT returncode, score, max_score FROM runs WHERE id IN ({_LATEST})", (assignment,))
+        scores = sorted(r["score"] for r in runs if r["score"] is not None)
+        returncodes: dict = {}
+        for r in runs:
+            returncodes[r["returncode"]] = returncodes.get(r["returncode"], 0) + 1
+        tests = self._query(
+            "SELECT name, status, count(*) AS n FROM tests WHERE assignment = ?"
+            f" AND run_id IN ({_LATEST}) GROUP BY name, status", (assignment, assignment))
+        per_test: dict[str, dict] = {}
+        for t in tests:
+            per_test.setdefault(t["name"], {})[t["status"]] = t["n"]
+        for counts in per_test.values():
+            counts["pass_rate"] = round(counts.get("passed", 0) / sum(counts.values()), 4)
+        return {
+            "students": len(runs),
+            "runs": self._query("SELECT count(*) AS n FROM runs WHERE assignment = ?", (assignment,))[0]["n"],
+            "mean_score": round(sum(scores) / len(scores), 4) if scores else None,
+            "median_score": scores[len(scores) // 2] if scores else None,
+            "returncodes": returncodes,
+            "tests": dict(sorted(per_test.items(), key=lambda kv: kv[1]["pass_rate"])),
+        }
@@ -0,0 +1,45 @@
+import json, sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from feedback_stream import FeedbackStreamParser
+
+REPLY = 'Here is the feedback:\n' + json.dumps({
+    "insights": [
+        'Quote "escapes" and a backslash \\ survive',
+        "Brackets in strings: ] } [ { , are just text",
+        "Unicode é and a newline\nin one insight",
+    ],
+    "annotations": [
+        {"scope": "global", "hints": ["Check the loop bound.", "Empty input: return []"]},
+        {"scope": "function", "name": "spiral", "line": 12, "nested": {"ok": True, "n": None, "xs": [1, [2, 3]]}},
+        7,
+        "bare scalar",
+    ],
+}, indent=1)
+
+def _parse(chunks):
+    parser = FeedbackStreamParser()
+    items = [item for chunk in chunks for item in parser.feed(chunk)]
+    return items, parser.result()
+
+def _expected():
+    doc = json.loads(REPLY[REPLY.index("{"):])
+    return [(k, v) for k in ("insights", "annotations") for v in doc[k]], doc
+
+def test_items_match_json_loads_at_every_chunk_size():
+    expected_items, expected_doc = _expected()
+    for size in (1, 2, 3, 5, 7, 16, 64, len(REPLY)):
+        items, doc = _parse(REPLY[i:i + size] for i in range(0, len(REPLY), size))
+        assert items == expected_items, size
+        assert doc == expected_doc, size
+
+def test_split_inside_escape_and_at_closing_bracket():
+    expected_items, expected_doc = _expected()
+    cuts = [REPLY.index("\\\\") + 1, REPLY.index('\\"') + 1, REPLY.index("\\n") + 1, REPLY.index("]"),
+            REPLY.index("]") + 1, REPLY.rindex("]"), REPLY.rindex("]") + 1]
+    bounds = [0, *sorted(set(cuts)), len(REPLY)]
+    items, doc = _parse(REPLY[a:b] for a, b in zip(bounds, bounds[1:]))
+    assert items == expected_items
+    assert doc == expected_doc
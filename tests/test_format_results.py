@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from claude_test import FormatAutograderResults
+
+def _results(groups: int) -> dict:
+    # Group 0 is the largest (ranked first); every other test fails with its own message.
+    tests = [{"name": f"test_big_{i}", "status": "failed", "score": 0, "max_score": 1,
+              "output": "AssertionError: spiral([[1,2],[3,4]]) returned [1,2,3,4], expected [1,2,4,3]"}
+             for i in range(8)]
+    tests += [{"name": f"test_case_{i}", "status": "failed", "score": 0, "max_score": 1,
+               "output": f"AssertionError: case {i} " + "x" * 400} for i in range(1, groups)]
+    return {"returncode": 1, "stdout": "", "stderr": "", "gradescope_results": {"tests": tests}}
+
+def test_top_group_keeps_its_message_with_many_groups():
+    text = FormatAutograderResults(_results(40), token_budget=1000)
+    assert "(40 distinct)" in text
+    assert "expected [1,2,4,3]" in text
+    assert len(text) // 4 <= 1100
+
+def test_few_groups_all_keep_messages():
+    text = FormatAutograderResults(_results(3), token_budget=3000)
+    assert "expected [1,2,4,3]" in text
+    assert "case 1 x" in text and "case 2 x" in text
+
+def _excerpts(text: str) -> dict[str, int]:
+    """Message excerpt length per group, keyed by the group's header line."""
+    out: dict[str, int] = {}
+    header = None
+    for line in text.splitlines():
+        if line.startswith("- ["):
+            header = line
+            out[header] = 0
+        elif line.startswith("  > ") and header:
+            out[header] += len(line) - 4
+    return out
+
+def test_top_group_excerpt_not_shorter_than_lower_ranked():
+    tests = [{"name": f"test_g{g}_{i}", "status": "failed", "score": 0, "max_score": 1,
+              "output": f"AssertionError: group {g} " + "y" * 3000}
+             for g, size in enumerate((6, 5, 4, 3, 2, 1)) for i in range(size)]
+    text = FormatAutograderResults({"returncode": 1, "gradescope_results": {"tests": tests}}, token_budget=2000)
+    lengths = list(_excerpts(text).values())
+    assert len(lengths) == 6
+    assert lengths[0] >= lengths[2] > 0
+    assert lengths[0] == max(lengths)
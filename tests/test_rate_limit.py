@@ -0,0 +1,70 @@
+import sys, time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rate_limit import RateLimiter, TokenBucket
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: str = "0.05"):
+        super().__init__("429")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": retry_after})
+
+def _flaky(failures: int, retry_after: str = "0.05"):
+    """fn raising failures 429s with retry-after, then returning "ok"."""
+    calls = {"n": 0}
+    def fn():
+        calls["n"] += 1
+        if calls["n"] <= failures:
+            raise RateLimited(retry_after)
+        return "ok"
+    return fn, calls
+
+def test_429_halves_limit_once_per_cooldown_and_honours_retry_after():
+    rl = RateLimiter(initial_concurrency=8, base_delay=0.001)
+    fn, calls = _flaky(2)
+    started = time.monotonic()
+    assert rl.call(fn) == "ok"
+    assert time.monotonic() - started >= 0.1  # two retry-after waits of 0.05s
+    assert calls["n"] == 3
+    assert rl.counts["calls"] == 3 and rl.counts["retries"] == 2 and rl.counts["throttled"] == 2
+    # Both 429s land inside one cool-down: halved once (8 -> 4), then +1/limit for the success.
+    assert rl.limit == pytest.approx(4 + 1 / 4)
+
+def test_tokens_charged_once_per_call_not_per_retry():
+    rl = RateLimiter(requests_per_minute=6000, input_tokens_per_minute=600_000, base_delay=0.001)
+    tokens, requests = rl.tokens.level, rl.requests.level
+    fn, _ = _flaky(2, retry_after="0")
+    rl.call(fn, input_tokens=4000)
+    # Refill over the test's few milliseconds is at most a few hundred tokens, far from a second charge.
+    assert tokens - 4000 <= rl.tokens.level < tokens - 3000
+    assert requests - 1 <= rl.requests.level < requests
+
+def test_gives_up_after_max_retries_and_passes_other_errors_through():
+    rl = RateLimiter(max_retries=2, base_delay=0.001)
+    fn, calls = _flaky(10, retry_after="0")
+    with pytest.raises(RateLimited):
+        rl.call(fn)
+    assert calls["n"] == 3
+    def broken():
+        raise ValueError("not retryable")
+    with pytest.raises(ValueError):
+        rl.call(broken)
+    assert rl.counts["retries"] == 2
+
+def test_debit_charges_and_refunds_within_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=100)
+    bucket.take(60)
+    assert bucket.level == pytest.approx(40, abs=0.1)
+    bucket.debit(30)  # actual usage above the estimate
+    assert bucket.level == pytest.approx(10, abs=0.1)
+    bucket.debit(-500)  # refunds never overfill
+    assert bucket.level == 100
+
+def test_unlimited_by_default():
+    rl = RateLimiter()
+    assert rl.requests.take(1_000_000) == 0.0 and rl.tokens.take(1_000_000) == 0.0
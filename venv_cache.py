@@ -0,0 +1,99 @@
+import hashlib, os, subprocess, sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from grader_cache import DirCache, default_cache_dir
+
+# Always present: the fallback path runs the bundle's tests with `python -m pytest`.
+BASE_REQUIREMENTS = ["pytest"]
+DEFAULT_REQUIREMENTS = ["gradescope-utils", "pytest"]
+
+def normalize_requirements(text: str) -> list[str]:
+    """Requirement lines without comments/blank lines, whitespace-collapsed, deduped and sorted."""
+    reqs = set()
+    for line in text.splitlines():
+        line = line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        line = " ".join(line.split())
+        reqs.add(line if "://" in line else line.lower())
+    return sorted(reqs)
+
+def _venv_python(venv: Path) -> Path:
+    return venv / "bin" / "python"
+
+def _relocate(staging: Path, final: Path):
+    """venv bakes its own path into script shebangs and activate files; point them at the final location."""
+    old, new = str(staging).encode(), str(final).encode()
+    for p in (staging / "bin").iterdir():
+        if p.is_symlink() or not p.is_file():
+            continue
+        data = p.read_bytes()
+        if old in data:
+            p.write_bytes(data.replace(old, new))
+
+class VenvCache:
+    """
+    Virtualenvs keyed by the normalized requirements they were built from.
+    With a wheelhouse, installs run with --no-index so no network access is needed.
+    """
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = 8 << 30,
+                 wheelhouse: Optional[Path] = None, python: str = sys.executable):
+        self.cache = DirCache(root or default_cache_dir("venvs"), max_bytes)
+        wheelhouse = wheelhouse or os.environ.get("CODEASSIST_WHEELHOUSE")
+        self.wheelhouse = Path(wheelhouse) if wheelhouse else None
+        self.python = python
+
+    def requirements_for(self, req: Optional[Path]) -> list[str]:
+        reqs = normalize_requirements(req.read_text(errors="ignore")) if req else list(DEFAULT_REQUIREMENTS)
+        return sorted(set(reqs) | set(BASE_REQUIREMENTS))
+
+    def key(self, requirements: list[str]) -> str:
+        h = hashlib.sha256()
+        h.update(f"{self.python}\n{sys.version_info[:2]}\n".encode())
+        h.update("\n".join(requirements).encode())
+        return h.hexdigest()[:32]
+
+    def _pip_source_args(self) -> list[str]:
+        if self.wheelhouse:
+            return ["--no-index", "--find-links", str(self.wheelhouse)]
+        return []
+
+    def _builder(self, key: str, requirements: list[str], timeout: int, log: dict):
+        def build(staging: Path):
+            subprocess.run([self.python, "-m", "venv", str(staging)],
+                           capture_output=True, text=True, timeout=timeout, check=True)
+            req_file = staging / "requirements.lock.in"
+            req_file.write_text("\n".join(requirements) + "\n")
+            pip = subprocess.run([str(_venv_python(staging)), "-m", "pip", "install", "--disable-pip-version-check",
+                                  "--no-input", *self._pip_source_args(), "-r", str(req_file)],
+                                 capture_output=True, text=True, timeout=timeout)
+            log.update({"pip_returncode": pip.returncode, "pip_stdout": pip.stdout[-4000:], "pip_stderr": pip.stderr[-4000:]})
+            if pip.returncode != 0:
+                raise subprocess.CalledProcessError(pip.returncode, pip.args, pip.stdout, pip.stderr)
+            _relocate(staging, self.cache.path(key))
+        return build
+
+    @contextmanager
+    def interpreter(self, req: Optional[Path], timeout: int = 600, log: Optional[dict] = None) -> Iterator[Path]:
+        """
+        Yield the interpreter of a venv satisfying req (or the default grading deps); the venv is
+        protected from eviction until the block exits. Builds it on first use (pip output goes to log)
+        and raises CalledProcessError if that fails.
+        """
+        log = log if log is not None else {}
+        requirements = self.requirements_for(req)
+        key = self.key(requirements)
+        log.update({"venv_key": key, "venv_cache_hit": self.cache.path(key).is_dir()})
+        with self.cache.use(key, self._builder(key, requirements, timeout, log)) as venv:
+            yield _venv_python(venv)
+
+    def fill_wheelhouse(self, req: Optional[Path], timeout: int = 600) -> subprocess.CompletedProcess:
+        """Download wheels for req into the wheelhouse (run once on a host with network access)."""
+        if not self.wheelhouse:
+            raise ValueError("VenvCache has no wheelhouse configured")
+        self.wheelhouse.mkdir(parents=True, exist_ok=True)
+        return subprocess.run([self.python, "-m", "pip", "download", "--disable-pip-version-check",
+                               "-d", str(self.wheelhouse), *self.requirements_for(req)],
+                              capture_output=True, text=True, timeout=timeout)